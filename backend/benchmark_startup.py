@@ -0,0 +1,125 @@
+"""
+Chat Lambda Startup Benchmark
+
+Measures how long a fresh interpreter takes to import chat_service_lambda.py
+(the Lambda init phase) and which top-level imports account for it, using
+Python's -X importtime output.
+
+Key Features:
+- Imports the module in a new subprocess per run, so every run is a cold start
+- Reports the median, min and max import wall time over the runs
+- Lists the slowest direct imports of the module by cumulative import time
+- Optionally times get_rag_instance() (embeddings, Pinecone and the local
+  knowledge index) in the same subprocess
+
+Usage:
+    python benchmark_startup.py [--runs 5] [--top 15] [--rag] [--module chat_service_lambda]
+
+- Run from the backend directory with the chat Lambda's requirements installed.
+- --rag needs OPENAI_API_KEY, PINECONE_API_KEY and PINECONE_HOST to connect.
+- CHAT_PREWARM is disabled in the subprocesses so the timings only cover the
+  import itself.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# "import time:  self [us] | cumulative | imported package", nesting shown by indentation
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$')
+
+BENCHMARK_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+rag_seconds = None
+if sys.argv[2] == '1':
+    module.get_rag_instance()
+    rag_seconds = time.perf_counter() - imported
+print(json.dumps({'import_seconds': imported - started, 'rag_seconds': rag_seconds}))
+"""
+
+
+def parse_importtime(stderr: str, module: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds of each direct import of module"""
+    entries: List[Tuple[int, str, int]] = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            entries.append((len(match.group(3)), match.group(4), int(match.group(2))))
+
+    # Entries are printed when an import finishes, so the module's own imports
+    # are the entries one level deeper that come before it
+    direct = {}
+    for position, (depth, name, cumulative) in enumerate(entries):
+        if name != module:
+            continue
+        for child_depth, child_name, child_cumulative in reversed(entries[:position]):
+            if child_depth <= depth:
+                break
+            if child_depth == depth + 2:
+                direct[child_name] = child_cumulative
+        direct[module] = cumulative
+        break
+    return direct
+
+
+def run_once(module: str, rag: bool) -> Tuple[dict, Dict[str, int]]:
+    """Import the module in a fresh interpreter and return its timings"""
+    env = dict(os.environ, CHAT_PREWARM='false')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BENCHMARK_SCRIPT, module, '1' if rag else '0'],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(result.stderr, module)
+
+
+def benchmark(module: str, runs: int, top: int, rag: bool) -> None:
+    import_seconds = []
+    rag_seconds = []
+    module_imports = defaultdict(list)
+
+    for run in range(runs):
+        timings, imports = run_once(module, rag)
+        import_seconds.append(timings['import_seconds'])
+        if timings['rag_seconds'] is not None:
+            rag_seconds.append(timings['rag_seconds'])
+        for name, cumulative in imports.items():
+            module_imports[name].append(cumulative)
+        print(f"Run {run + 1}: import {timings['import_seconds']:.3f}s"
+              + (f", get_rag_instance {timings['rag_seconds']:.3f}s" if timings['rag_seconds'] is not None else ""))
+
+    print(f"\nimport {module}: median {statistics.median(import_seconds):.3f}s, "
+          f"min {min(import_seconds):.3f}s, max {max(import_seconds):.3f}s over {runs} runs")
+    if rag_seconds:
+        print(f"get_rag_instance(): median {statistics.median(rag_seconds):.3f}s")
+
+    ranked = sorted(
+        ((statistics.median(times), name) for name, times in module_imports.items() if name != module),
+        reverse=True
+    )
+    print(f"\nSlowest direct imports of {module} (median cumulative):")
+    for microseconds, name in ranked[:top]:
+        print(f"{microseconds / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold import time of the chat Lambda")
+    parser.add_argument('--module', default='chat_service_lambda')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--rag', action='store_true', help="Also time get_rag_instance()")
+
+    args = parser.parse_args()
+    benchmark(args.module, args.runs, args.top, args.rag)
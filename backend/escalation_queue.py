@@ -0,0 +1,29 @@
+"""
+Incident Escalation Queue Buckets
+
+Shared helper used by notify_user.py (which queues incidents) and
+notify_technician.py (which sweeps them), so both sides agree on the
+due-time bucket format of the incident-escalation-index.
+
+Key Features:
+- ESCALATION_DELAY_MINUTES: how long after an incident is created it becomes due
+- ESCALATION_BUCKET_MINUTES: width of one GSI4PK due-time bucket
+- get_escalation_bucket(): GSI4PK partition ("EscalationDue#<YYYY-MM-DDTHH:MM>") for a due time
+
+Usage:
+- Include this file in the deployment package of every Lambda that imports it.
+- Both Lambdas must run with the same ESCALATION_BUCKET_MINUTES.
+"""
+
+import os
+from datetime import datetime
+
+ESCALATION_DELAY_MINUTES = int(os.environ.get('ESCALATION_DELAY_MINUTES', '2'))
+ESCALATION_BUCKET_MINUTES = int(os.environ.get('ESCALATION_BUCKET_MINUTES', '1'))
+
+
+def get_escalation_bucket(due_at: int) -> str:
+    """Escalation queue partition for a due time (epoch seconds), floored to ESCALATION_BUCKET_MINUTES"""
+    bucket_seconds = ESCALATION_BUCKET_MINUTES * 60
+    bucket_start = datetime.utcfromtimestamp(due_at - due_at % bucket_seconds)
+    return f"EscalationDue#{bucket_start.strftime('%Y-%m-%dT%H:%M')}"
@@ -0,0 +1,245 @@
+"""
+Expo Push Delivery
+
+Shared helper used by notify_user.py and technician_response.py to deliver
+push notifications through the Expo Push Notification service.
+
+Key Features:
+- Splits messages into chunks of 100 (the Expo per-request limit)
+- Sends chunks concurrently over a pooled HTTP session with gzip request bodies
+- Stores push ticket ids (PK PushReceipts) and checks their receipts in a later
+  pass, once Expo has produced them (check_pending_receipts)
+- Prunes tokens Expo reports as DeviceNotRegistered from every User#/Device# item
+  holding them
+
+Usage:
+- Include this file in the deployment package of every Lambda that imports it.
+- Note: requires the 'requests' library to be included in the deployment package.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('expo_push')
+
+EXPO_PUSH_URL = 'https://exp.host/--/api/v2/push/send'
+EXPO_RECEIPTS_URL = 'https://exp.host/--/api/v2/push/getReceipts'
+
+# Expo limits: 100 messages per send request, 1000 ids per receipts request,
+# and recommends at most 6 concurrent requests per project
+MAX_MESSAGES_PER_REQUEST = 100
+MAX_RECEIPT_IDS_PER_REQUEST = 1000
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('EXPO_MAX_CONCURRENT_REQUESTS', '6'))
+
+# Bodies below this size are sent uncompressed
+GZIP_MIN_BYTES = 1024
+
+# Expo suggests checking receipts about 15 minutes after sending and drops them after 24 hours
+RECEIPT_DELAY_SECONDS = int(os.environ.get('EXPO_RECEIPT_DELAY_SECONDS', '900'))
+RECEIPT_MAX_AGE_SECONDS = 24 * 3600
+PENDING_RECEIPTS_PK = 'PushReceipts'
+
+# Pooled session reused across chunks and warm invocations
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+session.headers.update({
+    'Accept': 'application/json',
+    'Accept-encoding': 'gzip, deflate',
+    'Content-Type': 'application/json',
+})
+
+
+def is_expo_push_token(token: Optional[str]) -> bool:
+    """Basic validation to ensure it's an Expo token"""
+    return bool(token) and token.startswith('ExponentPushToken[')
+
+
+def post_json(url: str, payload: Any, timeout: int = 30) -> Dict[str, Any]:
+    """POST a JSON payload to Expo, gzip-compressing larger bodies"""
+    body = json.dumps(payload).encode('utf-8')
+    headers = {}
+    if len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body)
+        headers['Content-Encoding'] = 'gzip'
+
+    response = session.post(url, data=body, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def send_chunk(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Send one chunk of up to 100 messages and return one ticket per message"""
+    try:
+        return post_json(EXPO_PUSH_URL, messages).get('data', [])
+    except requests.exceptions.RequestException as e:
+        logger.error(f"❌ Error sending notifications to Expo API: {str(e)}")
+        return [{'status': 'error', 'message': str(e), 'details': {'error': 'RequestFailed'}} for _ in messages]
+
+
+def send_push_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Send messages in concurrent chunks, returning tickets in the same order as messages"""
+    chunks = [messages[i:i + MAX_MESSAGES_PER_REQUEST] for i in range(0, len(messages), MAX_MESSAGES_PER_REQUEST)]
+    if not chunks:
+        return []
+
+    if len(chunks) == 1:
+        return send_chunk(chunks[0])
+
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(chunks))) as executor:
+        return [ticket for tickets in executor.map(send_chunk, chunks) for ticket in tickets]
+
+
+def get_push_receipts(ticket_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch push receipts for ticket ids; ids whose receipt is not ready yet are absent"""
+    receipts = {}
+    for i in range(0, len(ticket_ids), MAX_RECEIPT_IDS_PER_REQUEST):
+        try:
+            response = post_json(EXPO_RECEIPTS_URL, {'ids': ticket_ids[i:i + MAX_RECEIPT_IDS_PER_REQUEST]})
+            receipts.update(response.get('data', {}))
+        except requests.exceptions.RequestException as e:
+            logger.error(f"❌ Error fetching push receipts from Expo API: {str(e)}")
+    return receipts
+
+
+def save_pending_receipts(table, ticket_tokens: Dict[str, str], device_keys: Dict[str, List[Dict[str, str]]]) -> None:
+    """Store ticket ids with their tokens and Device# keys for check_pending_receipts"""
+    ticket_ids = list(ticket_tokens)
+    for i in range(0, len(ticket_ids), MAX_RECEIPT_IDS_PER_REQUEST):
+        tickets = {ticket_id: ticket_tokens[ticket_id] for ticket_id in ticket_ids[i:i + MAX_RECEIPT_IDS_PER_REQUEST]}
+        try:
+            table.put_item(Item={
+                'PK': PENDING_RECEIPTS_PK,
+                'SK': f"Pending#{int(time.time()):010d}#{uuid.uuid4().hex[:8]}",
+                'tickets': tickets,
+                'deviceKeys': {token: device_keys.get(token, []) for token in set(tickets.values())}
+            })
+        except Exception as e:
+            logger.warning(f"Could not store {len(tickets)} push tickets for the receipts pass: {str(e)}")
+
+
+def check_pending_receipts(table, max_batches: int = 10) -> int:
+    """Check receipts of tickets stored at least RECEIPT_DELAY_SECONDS ago and prune dead tokens
+
+    Batches whose receipts could not be fetched are kept for the next pass until
+    Expo has dropped them. Returns the number of pruned tokens.
+    """
+    now = int(time.time())
+    try:
+        response = table.query(
+            KeyConditionExpression='PK = :pk AND SK < :due',
+            ExpressionAttributeValues={
+                ':pk': PENDING_RECEIPTS_PK,
+                ':due': f"Pending#{now - RECEIPT_DELAY_SECONDS:010d}"
+            },
+            Limit=max_batches
+        )
+    except Exception as e:
+        logger.warning(f"Could not load pending push receipts: {str(e)}")
+        return 0
+
+    pruned = 0
+    for item in response.get('Items', []):
+        tickets = item.get('tickets', {})
+        receipts = get_push_receipts(list(tickets))
+        created_at = int(item['SK'].split('#')[1])
+        if tickets and not receipts and now - created_at < RECEIPT_MAX_AGE_SECONDS:
+            continue
+
+        dead_tokens = []
+        for ticket_id, receipt in receipts.items():
+            if receipt.get('status') == 'error':
+                logger.error(f"Expo receipt error: {receipt.get('message')} - Details: {receipt.get('details')}")
+                if (receipt.get('details') or {}).get('error') == 'DeviceNotRegistered' and ticket_id in tickets:
+                    dead_tokens.append(tickets[ticket_id])
+        if dead_tokens:
+            pruned += prune_device_tokens(table, dead_tokens, item.get('deviceKeys', {}))
+
+        try:
+            table.delete_item(Key={'PK': item['PK'], 'SK': item['SK']})
+        except Exception as e:
+            logger.warning(f"Could not delete pending push receipts {item['SK']}: {str(e)}")
+
+    return pruned
+
+
+def prune_device_tokens(table, dead_tokens: List[str], device_keys: Dict[str, List[Dict[str, str]]]) -> int:
+    """Remove dead push tokens from every User#/Device# item holding them
+
+    The removal is conditional on the item still holding the same token so a device
+    that re-registered in the meantime keeps its new token.
+    """
+    pruned = 0
+    for token in set(dead_tokens):
+        for key in device_keys.get(token, []):
+            try:
+                table.update_item(
+                    Key=key,
+                    UpdateExpression='REMOVE pushToken, expo_push_token',
+                    ConditionExpression='pushToken = :token OR expo_push_token = :token',
+                    ExpressionAttributeValues={':token': token}
+                )
+                pruned += 1
+                logger.info(f"🧹 Pruned unregistered push token from {key['PK']}/{key['SK']}")
+            except Exception as e:
+                logger.warning(f"Could not prune push token from {key['PK']}/{key['SK']}: {str(e)}")
+    return pruned
+
+
+def send_expo_notifications(tokens: List[str], title: str, body: str, data: Dict[str, Any],
+                            table=None, device_keys: Optional[Dict[str, List[Dict[str, str]]]] = None,
+                            check_receipts: bool = True) -> bool:
+    """Sends push notifications to a list of Expo push tokens.
+
+    When a table and a token -> [Device# key, ...] map are given, tokens rejected in
+    the tickets as DeviceNotRegistered are pruned right away. With check_receipts the
+    ticket ids are stored for a later check_pending_receipts pass, which prunes tokens
+    the receipts report as DeviceNotRegistered.
+    """
+    messages = [{
+        'to': token,
+        'sound': 'default',
+        'title': title,
+        'body': body,
+        'data': data
+    } for token in dict.fromkeys(tokens) if is_expo_push_token(token)]
+
+    if not messages:
+        logger.warning("No valid Expo push tokens to send notifications to.")
+        return True  # Return true as there's no error, just no one to notify
+
+    tickets = send_push_messages(messages)
+
+    ticket_tokens = {}
+    dead_tokens = []
+    error_count = 0
+    for message, ticket in zip(messages, tickets):
+        if ticket.get('status') == 'ok':
+            if ticket.get('id'):
+                ticket_tokens[ticket['id']] = message['to']
+        else:
+            error_count += 1
+            logger.error(f"Expo push error: {ticket.get('message')} - Details: {ticket.get('details')}")
+            if (ticket.get('details') or {}).get('error') == 'DeviceNotRegistered':
+                dead_tokens.append(message['to'])
+    error_count += max(0, len(messages) - len(tickets))
+
+    logger.info(f"✅ Sent notifications to Expo in {-(-len(messages) // MAX_MESSAGES_PER_REQUEST)} chunk(s). "
+                f"Success: {len(messages) - error_count}, Errors: {error_count}")
+
+    if table is not None and device_keys:
+        if check_receipts and ticket_tokens:
+            save_pending_receipts(table, ticket_tokens, device_keys)
+        if dead_tokens:
+            pruned = prune_device_tokens(table, dead_tokens, device_keys)
+            logger.info(f"Pruned {pruned} unregistered push tokens")
+
+    return error_count == 0
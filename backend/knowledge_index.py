@@ -0,0 +1,316 @@
+"""
+Local Knowledge Base Index
+
+Snapshot of the Pinecone O&M knowledge base that chat_service_lambda.py searches
+in-process, with Pinecone as the fallback.
+
+Key Features:
+- Exports every vector of a Pinecone namespace to a directory:
+  - vectors.npy: L2-normalized float16 matrix, one row per chunk
+  - metadata.bin / offsets.npy: UTF-8 JSON records ({"id", "text", "metadata"})
+    concatenated, with the byte offset of each record
+  - manifest.json: namespace, embedding model, dimension and count
+- Loads a snapshot with both the matrix and the records memory-mapped
+- Exact cosine search over the matrix, scanned in blocks
+- Hybrid search: BM25 over the chunk texts fused with the vector ranking by
+  reciprocal rank fusion, so exact error codes and model numbers are found
+
+Usage:
+    python knowledge_index.py export [--namespace OM] [--out knowledge_index]
+    python knowledge_index.py search "How do I reset my inverter?" [--index knowledge_index] [--k 7]
+
+- Include this file and the exported directory in the chat Lambda's deployment
+  package; set KNOWLEDGE_INDEX_PATH if the directory is not next to this file.
+- Re-export whenever documents are added to the namespace.
+
+Environment Variables:
+    - PINECONE_API_KEY / PINECONE_HOST: Pinecone index to export
+    - OPENAI_API_KEY: used by the search command to embed the query
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('knowledge_index')
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge_index')
+DEFAULT_NAMESPACE = 'OM'
+EMBEDDING_MODEL = 'text-embedding-3-large'
+
+# PineconeVectorStore keeps the chunk text under this metadata key
+TEXT_KEY = 'text'
+
+# Pinecone fetch accepts up to 100 ids per request
+FETCH_BATCH_SIZE = 100
+
+# Rows converted to float32 at a time during search
+SEARCH_BLOCK_ROWS = 4096
+
+# Reciprocal rank fusion constant and the number of candidates taken from each ranking
+RRF_K = 60
+HYBRID_CANDIDATES = 20
+
+# Words, numbers and compound identifiers such as "symo-10.0-3-m" or "state-567"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms of a text; compound identifiers also yield their parts"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or '').lower()):
+        tokens.append(token)
+        parts = re.split(r"[./-]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class BM25Index:
+    """Okapi BM25 over a list of texts"""
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.count = len(texts)
+        self.lengths = np.zeros(self.count, dtype=np.float32)
+
+        postings = {}  # term -> ([doc, ...], [term frequency, ...])
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.lengths[i] = len(tokens)
+            for term, frequency in Counter(tokens).items():
+                docs, frequencies = postings.setdefault(term, ([], []))
+                docs.append(i)
+                frequencies.append(frequency)
+
+        self.postings = {
+            term: (np.asarray(docs, dtype=np.int64), np.asarray(frequencies, dtype=np.float32))
+            for term, (docs, frequencies) in postings.items()
+        }
+        self.avg_length = float(self.lengths.mean()) if self.count else 0.0
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every text for a query (0 where no term matches)"""
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            docs, frequencies = self.postings[term]
+            idf = np.log(1 + (self.count - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[docs] / max(self.avg_length, 1.0))
+            scores[docs] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+        return scores
+
+
+class LocalVectorIndex:
+    """Read-only, memory-mapped knowledge base snapshot with exact cosine search"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'metadata.bin'), 'rb') as f:
+            self.records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.vectors.shape[0] != len(self.offsets) - 1:
+            raise ValueError(f"Corrupt knowledge index at {path}: {self.vectors.shape[0]} vectors, {len(self.offsets) - 1} records")
+
+        # BM25 over the chunk texts, built on the first hybrid search
+        self.keywords: Optional[BM25Index] = None
+        self.keywords_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def embedding_model(self) -> str:
+        return self.manifest.get('embedding_model', '')
+
+    def record(self, i: int) -> Dict[str, Any]:
+        """Return the {"id", "text", "metadata"} record of row i"""
+        return json.loads(self.records[int(self.offsets[i]):int(self.offsets[i + 1])].decode('utf-8'))
+
+    def similarities(self, vector: List[float]) -> np.ndarray:
+        """Cosine similarity of every row to a query vector"""
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / np.linalg.norm(query)
+
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block = self.vectors[start:start + SEARCH_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def search(self, vector: List[float], k: int = 7) -> List[Tuple[Dict[str, Any], float]]:
+        """Return the k most similar records with their cosine similarity, best first"""
+        if len(self) == 0:
+            return []
+        scores = self.similarities(vector)
+        return [(self.record(i), float(scores[i])) for i in top_indices(scores, k)]
+
+    def keyword_index(self) -> BM25Index:
+        with self.keywords_lock:
+            if self.keywords is None:
+                self.keywords = BM25Index([self.record(i)['text'] for i in range(len(self))])
+            return self.keywords
+
+    def hybrid_search(self, vector: List[float], query: str, k: int = 7,
+                      candidates: int = HYBRID_CANDIDATES) -> List[Dict[str, Any]]:
+        """
+        Fuse the vector and BM25 rankings with reciprocal rank fusion.
+
+        Returns up to k hits, best first, as {"record", "score" (fused),
+        "similarity" (cosine), "keyword_score" (BM25), "keyword_rank" (0-based
+        rank in the BM25 candidates, None if not among them)}.
+        """
+        if len(self) == 0:
+            return []
+
+        similarities = self.similarities(vector)
+        keyword_scores = self.keyword_index().scores(query)
+        vector_ranking = top_indices(similarities, candidates)
+        keyword_ranking = [i for i in top_indices(keyword_scores, candidates) if keyword_scores[i] > 0]
+
+        fused = {}
+        for ranking in (vector_ranking, keyword_ranking):
+            for rank, i in enumerate(ranking):
+                fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (RRF_K + rank + 1)
+        keyword_ranks = {int(i): rank for rank, i in enumerate(keyword_ranking)}
+
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+        return [{
+            'record': self.record(i),
+            'score': fused[i],
+            'similarity': float(similarities[i]),
+            'keyword_score': float(keyword_scores[i]),
+            'keyword_rank': keyword_ranks.get(i)
+        } for i in best]
+
+
+def write_index(path: str, ids: List[str], vectors: List[List[float]], metadatas: List[Dict[str, Any]],
+                namespace: str = DEFAULT_NAMESPACE, embedding_model: str = EMBEDDING_MODEL) -> None:
+    """Write a snapshot directory from parallel lists of ids, vectors and Pinecone metadata"""
+    os.makedirs(path, exist_ok=True)
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1) if ids else np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    np.save(os.path.join(path, 'vectors.npy'), matrix.astype(np.float16))
+
+    offsets = [0]
+    with open(os.path.join(path, 'metadata.bin'), 'wb') as f:
+        for vector_id, metadata in zip(ids, metadatas):
+            metadata = dict(metadata or {})
+            text = metadata.pop(TEXT_KEY, '')
+            data = json.dumps({'id': vector_id, 'text': text, 'metadata': metadata}, default=str).encode('utf-8')
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(os.path.join(path, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump({
+            'namespace': namespace,
+            'embedding_model': embedding_model,
+            'dimension': int(matrix.shape[1]) if len(ids) else 0,
+            'count': len(ids),
+            'created_at': datetime.now().isoformat()
+        }, f, indent=2)
+
+
+def export_namespace(path: str, namespace: str = DEFAULT_NAMESPACE) -> int:
+    """Snapshot every vector in a Pinecone namespace; returns the number exported"""
+    from pinecone.grpc import PineconeGRPC as Pinecone
+
+    pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
+    index = pc.Index(host=os.getenv('PINECONE_HOST'))
+
+    # Listing ids requires a serverless index
+    vector_ids = [vector_id for batch in index.list(namespace=namespace) for vector_id in batch]
+    logger.info(f"Found {len(vector_ids)} vectors in namespace '{namespace}'")
+
+    ids, vectors, metadatas = [], [], []
+    for i in range(0, len(vector_ids), FETCH_BATCH_SIZE):
+        response = index.fetch(ids=vector_ids[i:i + FETCH_BATCH_SIZE], namespace=namespace)
+        for vector_id, vector in response.vectors.items():
+            ids.append(vector_id)
+            vectors.append(list(vector.values))
+            metadatas.append(dict(vector.metadata or {}))
+        logger.info(f"Fetched {len(ids)}/{len(vector_ids)} vectors")
+
+    write_index(path, ids, vectors, metadatas, namespace=namespace)
+    logger.info(f"Wrote knowledge index with {len(ids)} vectors to {path}")
+    return len(ids)
+
+
+def search_command(path: str, query: str, k: int) -> None:
+    """Embed a query and print the top matches with timings (offline retrieval checks)"""
+    from langchain_openai import OpenAIEmbeddings
+
+    index = LocalVectorIndex(path)
+    embeddings = OpenAIEmbeddings(api_key=os.getenv('OPENAI_API_KEY'), model=index.embedding_model or EMBEDDING_MODEL)
+
+    started = time.perf_counter()
+    vector = embeddings.embed_query(query)
+    embedded = time.perf_counter()
+    results = index.search(vector, k)
+    searched = time.perf_counter()
+    index.keyword_index()
+    indexed = time.perf_counter()
+    hits = index.hybrid_search(vector, query, k)
+    fused = time.perf_counter()
+
+    print(f"{len(index)} vectors, embed {1000 * (embedded - started):.1f} ms, search {1000 * (searched - embedded):.1f} ms")
+    print("Vector search:")
+    for record, score in results:
+        print(f"{score:.4f}  {record['id']}  {record['text'][:100]!r}")
+
+    print(f"Hybrid search ({1000 * (fused - indexed):.1f} ms, BM25 built in {1000 * (indexed - searched):.1f} ms):")
+    for hit in hits:
+        print(f"{hit['similarity']:.4f}  bm25={hit['keyword_score']:.2f}  {hit['record']['id']}  {hit['record']['text'][:100]!r}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Export or query the local knowledge base index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Snapshot a Pinecone namespace")
+    export_parser.add_argument('--namespace', default=DEFAULT_NAMESPACE)
+    export_parser.add_argument('--out', default=DEFAULT_INDEX_PATH)
+
+    search_parser = subparsers.add_parser('search', help="Search a snapshot")
+    search_parser.add_argument('query')
+    search_parser.add_argument('--index', default=DEFAULT_INDEX_PATH)
+    search_parser.add_argument('--k', type=int, default=7)
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_namespace(args.out, args.namespace)
+    else:
+        search_command(args.index, args.query, args.k)
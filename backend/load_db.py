@@ -2,7 +2,8 @@
 System Profile Data Loader
 
 This script loads PV system profile data from the Solar.web API and stores it in DynamoDB.
-Each system gets an entry with PK: System#<SystemId> and SK: PROFILE containing all system metadata.
+Each system gets an entry with PK: System#<SystemId> and SK: PROFILE containing all system metadata,
+and its ID is added to the PK: Registry / SK: SYSTEMS item used to list all systems (system_registry.py).
 
 Usage:
     python load.py
@@ -26,6 +27,7 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from botocore.exceptions import ClientError
 from decimal import Decimal
+from system_registry import add_to_system_registry
 
 # Set up logging
 logging.basicConfig(
@@ -299,7 +301,9 @@ def store_system_profile(profile_entry: Dict[str, Any]) -> bool:
     try:
         table.put_item(Item=profile_entry)
         logger.info(f"Successfully stored profile for system {profile_entry['systemId']}")
-        return True
+        
+        # Keep the admin system listing registry in sync with every profile written
+        return add_to_system_registry(table, [profile_entry['systemId']])
         
     except Exception as e:
         logger.error(f"Error storing profile for system {profile_entry['systemId']}: {str(e)}")
@@ -1,31 +1,45 @@
 """
-Solar System Technician Notification Handler - EventBridge Scheduler Version
+Solar System Technician Notification Handler - Escalation Queue Version
 
-This script handles EventBridge scheduler triggers for incident-based technician notifications.
-It processes incidents that have been pending for 1 hour and sends email notifications to technicians.
+This script sweeps the incident escalation queue for incidents whose escalation time
+has passed and sends email notifications to technicians.
 
 Key Features:
-- Triggered by EventBridge scheduler (1 hour after incident creation)
-- Receives incident_id and user_id from EventBridge payload
+- sweep_handler: triggered by a single EventBridge rate rule (e.g. every minute)
+- Queries due-time buckets of the sparse incident-escalation-index
+  (GSI4PK = "EscalationDue#<YYYY-MM-DDTHH:MM>", GSI4SK = due epoch seconds)
 - Fetches incident record from DynamoDB
 - Checks incident status (pending/dismissed)
 - Sends email to technician if still pending
-- Marks incident as processed and deletes schedule
+- Marks incident as processed, which removes it from the queue
 - Skips notification if incident was dismissed
+- Claims each incident with a conditional update before emailing, so overlapping
+  sweeps never email the same incident twice
+- Counts failed attempts per incident and takes an incident off the queue
+  (escalationFailedAt) after ESCALATION_MAX_ATTEMPTS, so it cannot pin the sweep cursor
+- Escalates due incidents in batches: one batch_get_item prefetch, one digest email
+  per technician and bulk processed/dismissed marks (batch_handler for ad-hoc batches)
+- lambda_handler still accepts legacy per-incident scheduler payloads
 
 Usage:
-- As AWS Lambda: deploy and configure with EventBridge scheduler trigger
+- As AWS Lambda: deploy with sweep_handler as the handler and an EventBridge rate rule
+- Locally: python notify_technician.py runs one sweep (no scheduler needed)
+- Tests: python -m pytest tests/test_escalation_sweep.py sweeps a stubbed table (no AWS access)
+- Requires escalation_queue.py in the deployment package (shared with notify_user.py)
 - Requires AWS SES permissions for sending emails
-- Requires EventBridge scheduler permissions for cleanup
+- Requires EventBridge scheduler permissions to clean up legacy schedules
 """
 
 import json
 import logging
 import os
 import boto3
-from typing import Dict, Any, Optional
+from typing import Dict, List, Any, Optional
 from datetime import datetime
+import time
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from escalation_queue import ESCALATION_BUCKET_MINUTES, ESCALATION_DELAY_MINUTES, get_escalation_bucket
 
 # Set up logging
 logging.basicConfig(
@@ -43,6 +57,18 @@ table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_NAME', 'Moose-DDB'))
 ses_client = boto3.client('ses', region_name=AWS_REGION)
 scheduler = boto3.client('scheduler', region_name=AWS_REGION)
 
+# Escalation queue (written by notify_user.py, bucket format shared via escalation_queue.py)
+ESCALATION_INDEX_NAME = os.environ.get('ESCALATION_INDEX_NAME', 'incident-escalation-index')
+SWEEP_MAX_LOOKBACK_MINUTES = int(os.environ.get('SWEEP_MAX_LOOKBACK_MINUTES', '1440'))
+# Buckets swept when there is no saved cursor (first run or lost cursor item)
+SWEEP_INITIAL_LOOKBACK_MINUTES = int(os.environ.get('SWEEP_INITIAL_LOOKBACK_MINUTES', str(ESCALATION_DELAY_MINUTES)))
+SWEEP_CURSOR_KEY = {'PK': 'EscalationSweep', 'SK': 'CURSOR'}
+ESCALATION_BATCH_SIZE = int(os.environ.get('ESCALATION_BATCH_SIZE', '100'))
+# Failed sweeps after which an incident is taken off the queue
+ESCALATION_MAX_ATTEMPTS = int(os.environ.get('ESCALATION_MAX_ATTEMPTS', '5'))
+# How long a sweep's claim keeps other sweeps off an incident; keep above the function timeout
+ESCALATION_CLAIM_SECONDS = int(os.environ.get('ESCALATION_CLAIM_SECONDS', '300'))
+
 def get_incident_record(incident_id: str, user_id: str) -> Optional[Dict[str, Any]]:
     """Fetch incident record from DynamoDB"""
     try:
@@ -140,7 +166,7 @@ def mark_incident_as_dismissed(incident_id: str, user_id: str, reason: str = "st
                 'PK': f'Incident#{incident_id}',
                 'SK': f'User#{user_id}'
             },
-            UpdateExpression='SET #status = :status, processedAt = :processed_at, dismissedReason = :reason',
+            UpdateExpression='SET #status = :status, processedAt = :processed_at, dismissedReason = :reason REMOVE GSI4PK, GSI4SK',
             ExpressionAttributeNames={
                 '#status': 'status'
             },
@@ -253,7 +279,7 @@ def mark_incident_as_processed(incident_id: str, user_id: str) -> bool:
                 'PK': f'Incident#{incident_id}',
                 'SK': f'User#{user_id}'
             },
-            UpdateExpression='SET #status = :status, processedAt = :processed_at',
+            UpdateExpression='SET #status = :status, processedAt = :processed_at REMOVE GSI4PK, GSI4SK',
             ExpressionAttributeNames={
                 '#status': 'status'
             },
@@ -283,8 +309,206 @@ def cleanup_schedule(incident_id: str, user_id: str) -> bool:
         logger.error(f"❌ Failed to delete EventBridge schedule {schedule_name}: {str(e)}")
         return False
 
+def dequeue_incident_escalation(incident_id: str, user_id: str) -> bool:
+    """Remove an incident from the escalation queue without changing its status"""
+    try:
+        table.update_item(
+            Key={
+                'PK': f'Incident#{incident_id}',
+                'SK': f'User#{user_id}'
+            },
+            UpdateExpression='REMOVE GSI4PK, GSI4SK'
+        )
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Failed to dequeue incident {incident_id}: {str(e)}")
+        return False
+
+def claim_incident_escalation(incident_id: str, user_id: str) -> bool:
+    """Claim a pending incident before emailing; False if it is processed or claimed by another sweep"""
+    now = int(time.time())
+    try:
+        table.update_item(
+            Key={
+                'PK': f'Incident#{incident_id}',
+                'SK': f'User#{user_id}'
+            },
+            UpdateExpression='SET escalationClaimedAt = :now',
+            ConditionExpression='#status = :pending AND (attribute_not_exists(escalationClaimedAt) OR escalationClaimedAt < :stale)',
+            ExpressionAttributeNames={
+                '#status': 'status'
+            },
+            ExpressionAttributeValues={
+                ':now': now,
+                ':pending': 'pending',
+                ':stale': now - ESCALATION_CLAIM_SECONDS
+            }
+        )
+        return True
+        
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            logger.info(f"Incident {incident_id} is processed or claimed by another sweep - skipping")
+            return False
+        raise
+
+def record_escalation_failure(incident_id: str, user_id: str) -> bool:
+    """Count a failed escalation attempt and release the claim
+    
+    After ESCALATION_MAX_ATTEMPTS the incident is taken off the queue and marked with
+    escalationFailedAt. Returns True when the incident was dequeued.
+    """
+    key = {
+        'PK': f'Incident#{incident_id}',
+        'SK': f'User#{user_id}'
+    }
+    try:
+        response = table.update_item(
+            Key=key,
+            UpdateExpression='ADD escalationAttempts :one REMOVE escalationClaimedAt',
+            ConditionExpression='attribute_exists(PK)',
+            ExpressionAttributeValues={':one': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+        attempts = int(response['Attributes']['escalationAttempts'])
+        if attempts < ESCALATION_MAX_ATTEMPTS:
+            return False
+        
+        table.update_item(
+            Key=key,
+            UpdateExpression='SET escalationFailedAt = :failed_at REMOVE GSI4PK, GSI4SK',
+            ExpressionAttributeValues={':failed_at': int(datetime.now().timestamp())}
+        )
+        logger.error(f"❌ Incident {incident_id} failed escalation {attempts} times - removed from the escalation queue")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Failed to record escalation failure for incident {incident_id}: {str(e)}")
+        return False
+
+def get_sweep_cursor() -> Optional[int]:
+    """Get the start (epoch seconds) of the oldest bucket the next sweep has to look at"""
+    try:
+        response = table.get_item(Key=SWEEP_CURSOR_KEY)
+        if 'Item' in response:
+            return int(response['Item']['bucketStart'])
+        return None
+        
+    except Exception as e:
+        logger.error(f"Error getting escalation sweep cursor: {str(e)}")
+        return None
+
+def save_sweep_cursor(bucket_start: int) -> None:
+    """Persist the oldest bucket that may still hold due incidents"""
+    try:
+        table.put_item(Item={
+            **SWEEP_CURSOR_KEY,
+            'bucketStart': bucket_start,
+            'updatedAt': datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Error saving escalation sweep cursor: {str(e)}")
+
+def query_due_incidents(bucket: str, now: int) -> List[Dict[str, Any]]:
+    """Query one escalation bucket for incidents whose due time has passed"""
+    incidents = []
+    query_kwargs = {
+        'IndexName': ESCALATION_INDEX_NAME,
+        'KeyConditionExpression': Key('GSI4PK').eq(bucket) & Key('GSI4SK').lte(now)
+    }
+    
+    while True:
+        response = table.query(**query_kwargs)
+        incidents.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return incidents
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def sweep_due_incidents(now: Optional[int] = None) -> Dict[str, Any]:
+    """Escalate every queued incident that is due, bucket by bucket
+    
+    Walks the due-time buckets from the saved cursor (bounded by SWEEP_MAX_LOOKBACK_MINUTES,
+    or SWEEP_INITIAL_LOOKBACK_MINUTES back when there is none) up to the current bucket. The cursor is advanced to the oldest bucket that still has
+    an unprocessed incident, so failures are retried and the current, partially due
+    bucket is looked at again by the next sweep. An incident that fails
+    ESCALATION_MAX_ATTEMPTS sweeps is dequeued and no longer holds the cursor back.
+    """
+    now = int(now if now is not None else time.time())
+    bucket_seconds = ESCALATION_BUCKET_MINUTES * 60
+    current_bucket_start = now - now % bucket_seconds
+    oldest_allowed = current_bucket_start - SWEEP_MAX_LOOKBACK_MINUTES * 60
+    
+    cursor = get_sweep_cursor()
+    if cursor is None:
+        # Nothing saved yet - only look back as far as an incident created now could be
+        # overdue, instead of querying every bucket of the full lookback window
+        cursor = current_bucket_start - SWEEP_INITIAL_LOOKBACK_MINUTES * 60
+        logger.warning(f"No escalation sweep cursor saved - starting from {get_escalation_bucket(cursor)}")
+    elif cursor < oldest_allowed:
+        left_behind = [item['PK'].replace('Incident#', '') for item in query_due_incidents(get_escalation_bucket(cursor), now)]
+        logger.error(f"Escalation sweep cursor {get_escalation_bucket(cursor)} is older than SWEEP_MAX_LOOKBACK_MINUTES; "
+                     f"buckets before {get_escalation_bucket(oldest_allowed)} are no longer swept "
+                     f"(still queued in the cursor bucket: {left_behind})")
+    bucket_start = max(cursor, oldest_allowed)
+    
+    summary = {
+        'buckets_swept': 0,
+        'incidents_due': 0,
+        'incidents_processed': 0,
+        'incidents_skipped': 0,
+        'incidents_dead_lettered': 0,
+        'errors': 0,
+        'results': []
+    }
+    next_cursor = current_bucket_start
+    
+    due_refs = []
+    while bucket_start <= current_bucket_start:
+        bucket = get_escalation_bucket(bucket_start)
+        for item in query_due_incidents(bucket, now):
+            due_refs.append({
+                'incident_id': item['PK'].replace('Incident#', ''),
+                'user_id': item['SK'].replace('User#', ''),
+                'bucket_start': bucket_start
+            })
+        summary['buckets_swept'] += 1
+        bucket_start += bucket_seconds
+    
+    summary['incidents_due'] = len(due_refs)
+    bucket_by_incident = {(ref['incident_id'], ref['user_id']): ref['bucket_start'] for ref in due_refs}
+    
+    # Escalate everything that is due in batches
+    for i in range(0, len(due_refs), ESCALATION_BATCH_SIZE):
+        for result in process_incident_batch(due_refs[i:i + ESCALATION_BATCH_SIZE]):
+            summary['results'].append(result)
+            incident_bucket = bucket_by_incident[(result['incident_id'], result['user_id'])]
+            if result['status'] == 'error':
+                summary['errors'] += 1
+                if record_escalation_failure(result['incident_id'], result['user_id']):
+                    summary['incidents_dead_lettered'] += 1
+                else:
+                    next_cursor = min(next_cursor, incident_bucket)
+            elif result['status'] == 'claimed':
+                # Another sweep is handling it; look again in case that sweep dies
+                summary['incidents_skipped'] += 1
+                next_cursor = min(next_cursor, incident_bucket)
+            else:
+                summary['incidents_processed'] += 1
+    
+    save_sweep_cursor(next_cursor)
+    
+    logger.info(f"Swept {summary['buckets_swept']} buckets: {summary['incidents_due']} due, "
+                f"{summary['incidents_processed']} processed, {summary['incidents_skipped']} claimed elsewhere, "
+                f"{summary['errors']} errors ({summary['incidents_dead_lettered']} dequeued)")
+    return summary
+
 def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, Any]:
-    """Process a scheduled incident notification"""
+    """Process a due incident notification
+    
+    Marking the incident processed or dismissed also removes it from the escalation
+    queue; incidents that error stay queued and are retried by the next sweep.
+    """
     result = {
         'incident_id': incident_id,
         'user_id': user_id,
@@ -292,7 +516,6 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
         'action_taken': 'none',
         'email_sent': False,
         'marked_processed': False,
-        'schedule_cleaned': False,
         'message': '',
         'new_status': 'unknown'
     }
@@ -303,7 +526,6 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
         if not incident:
             result['message'] = 'Incident record not found - ignoring'
             result['status'] = 'ignored'
-            result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
             return result
         
         # Step 2: Check incident status
@@ -314,7 +536,6 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
             # User dismissed the incident - just mark as processed and cleanup
             result['action_taken'] = 'dismissed_cleanup'
             result['marked_processed'] = mark_incident_as_processed(incident_id, user_id)
-            result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
             result['message'] = 'Incident was dismissed - cleaned up without email'
             result['status'] = 'success'
             return result
@@ -340,7 +561,6 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
                     logger.info(f"Device {device_id} has recovered (status: green) - dismissing incident")
                     result['action_taken'] = 'dismissed_status_reverted'
                     result['marked_processed'] = mark_incident_as_dismissed(incident_id, user_id, "Incident was dismissed - status reverted")
-                    result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
                     result['message'] = 'Incident was dismissed - status reverted'
                     result['status'] = 'success'
                     return result
@@ -354,7 +574,7 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
             if not user_profile:
                 result['message'] = 'User profile not found - ignoring'
                 result['status'] = 'ignored'
-                result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
+                dequeue_incident_escalation(incident_id, user_id)
                 return result
             
             technician_email = user_profile.get('technician_email')
@@ -362,7 +582,6 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
                 result['message'] = 'No technician email found - ignoring'
                 result['status'] = 'ignored'
                 result['marked_processed'] = mark_incident_as_processed(incident_id, user_id)
-                result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
                 return result
             
             # Step 5: Get system and device names
@@ -380,7 +599,6 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
             
             # Step 7: Mark as processed and cleanup
             result['marked_processed'] = mark_incident_as_processed(incident_id, user_id)
-            result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
             
             if result['email_sent'] and result['marked_processed']:
                 result['status'] = 'success'
@@ -394,7 +612,6 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
             # Unknown status - mark as processed and cleanup
             result['action_taken'] = 'unknown_status_cleanup'
             result['marked_processed'] = mark_incident_as_processed(incident_id, user_id)
-            result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
             result['message'] = f'Unknown incident status: {incident_status}'
             result['status'] = 'success'
             return result
@@ -402,12 +619,291 @@ def process_incident_notification(incident_id: str, user_id: str) -> Dict[str, A
     except Exception as e:
         logger.error(f"❌ Error processing incident notification: {str(e)}")
         result['message'] = f'Processing error: {str(e)}'
-        # Try to cleanup schedule even on error
-        result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
         return result
 
+def batch_get_items(keys: List[Dict[str, str]]) -> Dict[tuple, Dict[str, Any]]:
+    """Fetch many items with batch_get_item (100 keys per request), keyed by (PK, SK)"""
+    items = {}
+    unique_keys = list({(key['PK'], key['SK']): key for key in keys}.values())
+    
+    for i in range(0, len(unique_keys), 100):
+        request_items = {table.name: {'Keys': unique_keys[i:i + 100]}}
+        attempt = 0
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for item in response.get('Responses', {}).get(table.name, []):
+                items[(item['PK'], item['SK'])] = item
+            
+            # Retry throttled keys with exponential backoff
+            request_items = response.get('UnprocessedKeys') or {}
+            if request_items:
+                attempt += 1
+                if attempt > 5:
+                    logger.error(f"Giving up on {len(request_items[table.name]['Keys'])} unprocessed keys")
+                    break
+                time.sleep(0.05 * (2 ** attempt))
+    
+    return items
+
+def build_incident_mark(action: str, incident_id: str, user_id: str, reason: str = '') -> Dict[str, Any]:
+    """Build a transact_write_items Update for marking an incident processed/dismissed or dequeuing it"""
+    update = {
+        'TableName': table.name,
+        'Key': {
+            'PK': f'Incident#{incident_id}',
+            'SK': f'User#{user_id}'
+        }
+    }
+    
+    if action == 'dequeue':
+        update['UpdateExpression'] = 'REMOVE GSI4PK, GSI4SK'
+        return {'Update': update}
+    
+    update['ExpressionAttributeNames'] = {'#status': 'status'}
+    update['ExpressionAttributeValues'] = {
+        ':status': action,
+        ':processed_at': int(datetime.now().timestamp())
+    }
+    if action == 'dismissed':
+        update['UpdateExpression'] = 'SET #status = :status, processedAt = :processed_at, dismissedReason = :reason REMOVE GSI4PK, GSI4SK'
+        update['ExpressionAttributeValues'][':reason'] = reason
+    else:
+        update['UpdateExpression'] = 'SET #status = :status, processedAt = :processed_at REMOVE GSI4PK, GSI4SK'
+    
+    return {'Update': update}
+
+def write_incident_marks(marks: List[Dict[str, Any]]) -> List[bool]:
+    """Write incident marks in transactions of up to 100, falling back to single updates"""
+    written = []
+    for i in range(0, len(marks), 100):
+        chunk = marks[i:i + 100]
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=chunk)
+            written.extend([True] * len(chunk))
+        except Exception as e:
+            logger.warning(f"Bulk incident mark failed ({str(e)}), retrying {len(chunk)} marks individually")
+            for mark in chunk:
+                update = dict(mark['Update'])
+                update.pop('TableName')
+                try:
+                    table.update_item(**update)
+                    written.append(True)
+                except Exception as e:
+                    logger.error(f"❌ Failed to mark incident {update['Key']['PK']}: {str(e)}")
+                    written.append(False)
+    
+    logger.info(f"Wrote {sum(written)}/{len(marks)} incident marks")
+    return written
+
+def format_technician_digest_email(entries: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Format one email covering several escalated incidents for the same technician"""
+    if len(entries) == 1:
+        entry = entries[0]
+        return format_technician_email(entry['incident'], entry['system_name'], entry['device_name'])
+    
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
+    system_names = sorted({entry['system_name'] for entry in entries})
+    subject = f"URGENT: Solar System Alert - {len(entries)} devices ({', '.join(system_names[:3])}{'...' if len(system_names) > 3 else ''})"
+    
+    incident_sections = []
+    for index, entry in enumerate(entries, start=1):
+        incident = entry['incident']
+        user_id = incident.get('userId', 'Unknown')
+        created_time = datetime.fromtimestamp(float(incident.get('expiresAt', 0)) - 3600)
+        google_forms_link = f"https://docs.google.com/forms/d/e/1FAIpQLSd3Zz3kKNNogw377llp6pNm_yvcqVXi465U2dRClEdYFAzonw/viewform?usp=pp_url&entry.209729194={user_id}"
+        incident_sections.append(f"""
+{index}. {entry['device_name']} ({entry['system_name']})
+• System ID: {incident.get('systemId', 'Unknown')}
+• Device ID: {incident.get('deviceId', 'Unknown')}
+• Incident Created: {created_time.strftime("%Y-%m-%d %H:%M:%S UTC")}
+• Respond: {google_forms_link}
+""")
+    
+    body = f"""
+SOLAR SYSTEM ALERT - TECHNICIAN NOTIFICATION
+INCIDENT ESCALATION DIGEST ({len(entries)} INCIDENTS)
+
+Escalated At: {timestamp}
+Priority: HIGH - REQUIRES ATTENTION
+
+Incidents:
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{''.join(incident_sections)}
+Issue Description:
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Device status changes were detected and have been pending without user response.
+These incidents require immediate technician attention.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+This is an automated escalation from Moose.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+    
+    return {
+        'subject': subject,
+        'body': body
+    }
+
+def process_incident_batch(incident_refs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Process many due incidents at once (same decisions as process_incident_notification)
+    
+    All incident, device status, user profile and system profile items are prefetched
+    with batch_get_item, escalations are grouped into one digest email per technician,
+    and processed/dismissed marks are written in bulk. Incidents are claimed before
+    they are emailed; those held by another sweep get the status 'claimed'.
+    """
+    results = {}
+    marks = []
+    mark_owners = []
+    digests: Dict[str, List[Dict[str, Any]]] = {}
+    
+    refs = list({(ref['incident_id'], ref['user_id']): ref for ref in incident_refs}.values())
+    for ref in refs:
+        results[(ref['incident_id'], ref['user_id'])] = {
+            'incident_id': ref['incident_id'],
+            'user_id': ref['user_id'],
+            'status': 'error',
+            'action_taken': 'none',
+            'email_sent': False,
+            'marked_processed': False,
+            'message': '',
+            'new_status': 'unknown'
+        }
+    
+    def add_mark(result, action, reason=''):
+        marks.append(build_incident_mark(action, result['incident_id'], result['user_id'], reason))
+        mark_owners.append(result)
+    
+    try:
+        # Step 1: Get incident records
+        incidents = batch_get_items([
+            {'PK': f"Incident#{ref['incident_id']}", 'SK': f"User#{ref['user_id']}"} for ref in refs
+        ])
+        
+        # Step 2: Prefetch device status, user profile and system profile items in one pass
+        related_keys = []
+        for incident in incidents.values():
+            related_keys.append({'PK': f"Inverter#{incident.get('deviceId', 'Unknown')}", 'SK': 'STATUS'})
+            related_keys.append({'PK': f"User#{incident.get('userId')}", 'SK': 'PROFILE'})
+            related_keys.append({'PK': f"System#{incident.get('systemId', 'Unknown')}", 'SK': 'PROFILE'})
+        related = batch_get_items(related_keys)
+        logger.info(f"Prefetched {len(incidents)} incidents and {len(related)} related items")
+        
+        for (incident_id, user_id), result in results.items():
+            incident = incidents.get((f'Incident#{incident_id}', f'User#{user_id}'))
+            if not incident:
+                result['message'] = 'Incident record not found - ignoring'
+                result['status'] = 'ignored'
+                continue
+            
+            incident_status = incident.get('status', 'unknown')
+            result['new_status'] = incident.get('newStatus', 'unknown')
+            
+            if incident_status == 'dismissed':
+                result['action_taken'] = 'dismissed_cleanup'
+                result['message'] = 'Incident was dismissed - cleaned up without email'
+                result['status'] = 'success'
+                add_mark(result, 'processed')
+                continue
+            
+            if incident_status != 'pending':
+                result['action_taken'] = 'unknown_status_cleanup'
+                result['message'] = f'Unknown incident status: {incident_status}'
+                result['status'] = 'success'
+                add_mark(result, 'processed')
+                continue
+            
+            # Step 3: Check current device status before proceeding
+            device_id = incident.get('deviceId', 'Unknown')
+            current_device_status = related.get((f'Inverter#{device_id}', 'STATUS'))
+            if not current_device_status:
+                logger.warning(f"Could not get current status for device {device_id} - proceeding with notification")
+                result['action_taken'] = 'email_sent_no_status_check'
+            elif current_device_status.get('status', 'unknown') == 'green':
+                logger.info(f"Device {device_id} has recovered (status: green) - dismissing incident")
+                result['action_taken'] = 'dismissed_status_reverted'
+                result['message'] = 'Incident was dismissed - status reverted'
+                result['status'] = 'success'
+                add_mark(result, 'dismissed', "Incident was dismissed - status reverted")
+                continue
+            else:
+                result['action_taken'] = 'email_sent_status_confirmed'
+            
+            # Step 4: Get user profile for technician email
+            user_profile = related.get((f'User#{user_id}', 'PROFILE'))
+            if not user_profile:
+                result['message'] = 'User profile not found - ignoring'
+                result['status'] = 'ignored'
+                add_mark(result, 'dequeue')
+                continue
+            
+            technician_email = (user_profile.get('technician_email') or '').strip()
+            if not technician_email:
+                result['message'] = 'No technician email found - ignoring'
+                result['status'] = 'ignored'
+                add_mark(result, 'processed')
+                continue
+            
+            # Step 5: Get system and device names
+            system_id = incident.get('systemId', 'Unknown')
+            system_profile = related.get((f'System#{system_id}', 'PROFILE'))
+            if system_profile:
+                system_name = system_profile.get('name', system_profile.get('pvSystemName', f'System {system_id[:8]}'))
+            else:
+                system_name = f'System {system_id[:8]}'
+            
+            digests.setdefault(technician_email, []).append({
+                'incident': incident,
+                'result': result,
+                'system_name': system_name,
+                'device_name': get_device_name(device_id)
+            })
+        
+        # Step 6: Send one digest per technician; incidents whose email failed are not
+        # marked, so they stay queued and the next sweep retries them
+        for technician_email, entries in digests.items():
+            claimed = []
+            for entry in entries:
+                if claim_incident_escalation(entry['result']['incident_id'], entry['result']['user_id']):
+                    claimed.append(entry)
+                else:
+                    entry['result']['status'] = 'claimed'
+                    entry['result']['message'] = 'Processed or claimed by another sweep - skipped'
+            entries = claimed
+            if not entries:
+                continue
+            
+            email_content = format_technician_digest_email(entries)
+            email_sent = send_technician_email(technician_email, email_content['subject'], email_content['body'])
+            for entry in entries:
+                entry['result']['email_sent'] = email_sent
+                if email_sent:
+                    entry['result']['message'] = f'Email sent to {technician_email}'
+                    add_mark(entry['result'], 'processed')
+                else:
+                    entry['result']['message'] = 'Email failed - left queued for retry'
+        logger.info(f"Sent {len(digests)} technician digest emails")
+        
+        # Step 7: Write all marks in bulk
+        for result, written in zip(mark_owners, write_incident_marks(marks)):
+            result['marked_processed'] = written
+            if result['action_taken'].startswith('email_sent'):
+                result['status'] = 'success' if written and result['email_sent'] else 'error'
+            elif not written:
+                result['status'] = 'error'
+        
+    except Exception as e:
+        logger.error(f"❌ Error processing incident batch: {str(e)}")
+        for result in results.values():
+            if not result['marked_processed'] and result['status'] not in ('ignored', 'claimed'):
+                result['status'] = 'error'
+                result['message'] = f'Processing error: {str(e)}'
+    
+    return list(results.values())
+
 def lambda_handler(event, context):
-    """AWS Lambda handler function triggered by EventBridge Scheduler"""
+    """AWS Lambda handler for legacy per-incident EventBridge Scheduler payloads"""
     try:
         logger.info("Technician notification handler started (EventBridge Scheduler)")
         logger.info(f"Received event: {json.dumps(event)}")
@@ -431,6 +927,9 @@ def lambda_handler(event, context):
         # Process the incident notification
         result = process_incident_notification(incident_id, user_id)
         
+        # Schedules created before the escalation queue existed still deliver here
+        result['schedule_cleaned'] = cleanup_schedule(incident_id, user_id)
+        
         logger.info("=== INCIDENT PROCESSING COMPLETED ===")
         logger.info(f"🎯 Incident ID: {result['incident_id']}")
         logger.info(f"👤 User ID: {result['user_id']}")
@@ -454,4 +953,78 @@ def lambda_handler(event, context):
                 'error': str(e),
                 'message': 'Incident notification processing failed'
             })
-        } 
\ No newline at end of file
+        } 
+
+def batch_handler(event, context):
+    """AWS Lambda handler escalating many incidents at once
+    
+    Expects {"incidents": [{"incident_id": ..., "user_id": ...}, ...]}.
+    """
+    try:
+        incident_refs = [ref for ref in event.get('incidents', []) if ref.get('incident_id') and ref.get('user_id')]
+        logger.info(f"Technician notification batch started with {len(incident_refs)} incidents")
+        
+        results = []
+        for i in range(0, len(incident_refs), ESCALATION_BATCH_SIZE):
+            results.extend(process_incident_batch(incident_refs[i:i + ESCALATION_BATCH_SIZE]))
+        
+        summary = {
+            'incidents': len(results),
+            'emails_sent': sum(1 for result in results if result['email_sent']),
+            'errors': sum(1 for result in results if result['status'] == 'error'),
+            'results': results
+        }
+        
+        logger.info("=== INCIDENT BATCH COMPLETED ===")
+        logger.info(f"🎯 Incidents: {summary['incidents']}")
+        logger.info(f"📧 Incidents emailed: {summary['emails_sent']}")
+        logger.info(f"❌ Errors: {summary['errors']}")
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps(summary, default=str)
+        }
+        
+    except Exception as e:
+        logger.error(f"Lambda execution failed: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Incident batch processing failed'
+            })
+        }
+
+def sweep_handler(event, context):
+    """AWS Lambda handler for the periodic escalation sweep (single EventBridge rate rule)"""
+    try:
+        logger.info("Technician escalation sweep started")
+        
+        summary = sweep_due_incidents()
+        
+        logger.info("=== ESCALATION SWEEP COMPLETED ===")
+        logger.info(f"🪣 Buckets swept: {summary['buckets_swept']}")
+        logger.info(f"⏰ Incidents due: {summary['incidents_due']}")
+        logger.info(f"✅ Processed: {summary['incidents_processed']}")
+        logger.info(f"⏭️ Claimed by another sweep: {summary['incidents_skipped']}")
+        logger.info(f"❌ Errors: {summary['errors']} ({summary['incidents_dead_lettered']} dequeued)")
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps(summary, default=str)
+        }
+        
+    except Exception as e:
+        logger.error(f"Escalation sweep failed: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Escalation sweep failed'
+            })
+        }
+
+
+if __name__ == "__main__":
+    # Run one sweep locally against the configured table
+    print(json.dumps(json.loads(sweep_handler({}, None)['body']), indent=2))
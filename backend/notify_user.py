@@ -6,25 +6,33 @@ and sends push notifications to relevant users via the Expo Push Notification se
 
 Key Features:
 - Processes SNS messages for status changes
-- Looks up users with access to each system
+- Looks up users with access to each system (cached access map with TTL and /tmp snapshot)
 - Gathers Expo push tokens from all relevant user devices
-- Sends notifications in a single batch request to Expo for efficiency
+- Sends notifications to Expo in concurrent 100-message chunks (expo_push.py)
+- Prunes push tokens Expo reports as DeviceNotRegistered, checking the receipts of
+  earlier sends at the end of each invocation, after the new notifications go out
+- Creates incident records queued for technician escalation by due-time bucket
 - No DynamoDB status updates (handled by status_polling.py)
 
 Usage:
 - As AWS Lambda: deploy and configure with SNS trigger.
-- Note: This function requires the 'requests' library to be included in the deployment package.
+- Note: This function requires expo_push.py, system_registry.py, escalation_queue.py and the 'requests' library to be included in the deployment package.
 """
 
 import json
 import logging
 import os
 import boto3
-import requests
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from boto3.dynamodb.conditions import Key
+from expo_push import check_pending_receipts, send_expo_notifications
+from system_registry import ACCESS_MAP_VERSION_KEY
+# Incident escalation queue shared with notify_technician.sweep_handler
+from escalation_queue import ESCALATION_DELAY_MINUTES, get_escalation_bucket
+from concurrent.futures import ThreadPoolExecutor
+import botocore.config
 import time
 
 # Set up logging
@@ -37,31 +45,123 @@ logger = logging.getLogger('notify')
 # AWS Configuration
 AWS_REGION = os.environ.get('AWS_REGION_', 'us-east-1')
 
+# Maximum parallel DynamoDB queries when fanning out to users
+MAX_PARALLEL_QUERIES = int(os.environ.get('MAX_PARALLEL_QUERIES', '16'))
+
+# Configure DynamoDB with enough pooled connections for the parallel device queries
+dynamodb_config = botocore.config.Config(
+    max_pool_connections=50
+)
+
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION, config=dynamodb_config)
 table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_NAME', 'Moose-DDB'))
 sns = boto3.client('sns', region_name=AWS_REGION)
-scheduler = boto3.client('scheduler', region_name=AWS_REGION)
+
+# Namespace for deterministic incident ids (uuid5 of device, status change and user)
+INCIDENT_ID_NAMESPACE = uuid.UUID('6f1c9a52-3d4e-4b8a-9c0f-2e7d5b1a8c34')
+
+# User-to-system access map cache. Entries expire after a TTL and the whole map is
+# dropped when the version stamp item is bumped (system_registry.bump_access_map_version,
+# called by process_ttn_systems.py and device registration when links change).
+ACCESS_MAP_TTL_SECONDS = int(os.environ.get('ACCESS_MAP_TTL_SECONDS', '900'))
+ACCESS_MAP_VERSION_CHECK_SECONDS = int(os.environ.get('ACCESS_MAP_VERSION_CHECK_SECONDS', '60'))
+ACCESS_MAP_SNAPSHOT_PATH = os.environ.get('ACCESS_MAP_SNAPSHOT_PATH', '/tmp/access_map.json')
+access_map = {
+    'loaded': False,
+    'version': None,
+    'checkedAt': 0.0,
+    'systems': {}
+}
+
+def get_access_map_version() -> int:
+    """Read the access map version stamp bumped whenever user-system links or devices change"""
+    response = table.get_item(
+        Key=ACCESS_MAP_VERSION_KEY,
+        ProjectionExpression='version'
+    )
+    return int(response.get('Item', {}).get('version', 0))
+
+def load_access_map_snapshot():
+    """Load the /tmp access map snapshot left by a previous invocation in this container"""
+    access_map['loaded'] = True
+    try:
+        with open(ACCESS_MAP_SNAPSHOT_PATH) as f:
+            snapshot = json.load(f)
+        access_map['version'] = snapshot.get('version')
+        access_map['systems'] = snapshot.get('systems', {})
+        logger.info(f"Loaded access map snapshot with {len(access_map['systems'])} systems")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable access map snapshot: {str(e)}")
+
+def save_access_map_snapshot():
+    """Persist the access map to /tmp so warm containers start with it"""
+    try:
+        tmp_path = f"{ACCESS_MAP_SNAPSHOT_PATH}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': access_map['version'], 'systems': access_map['systems']}, f)
+        os.replace(tmp_path, ACCESS_MAP_SNAPSHOT_PATH)
+    except Exception as e:
+        logger.warning(f"Failed to save access map snapshot: {str(e)}")
+
+def refresh_access_map_version():
+    """Drop every cached entry when the version stamp has moved (checked at most every few seconds)"""
+    now = time.time()
+    if now - access_map['checkedAt'] < ACCESS_MAP_VERSION_CHECK_SECONDS:
+        return
+    
+    try:
+        version = get_access_map_version()
+    except Exception as e:
+        logger.warning(f"Could not read access map version, keeping cached entries: {str(e)}")
+        return
+    
+    access_map['checkedAt'] = now
+    if version != access_map['version']:
+        if access_map['systems']:
+            logger.info(f"Access map version changed {access_map['version']} → {version}, invalidating cache")
+        access_map['version'] = version
+        access_map['systems'] = {}
+
+def query_users_with_system_access(system_id: str) -> List[str]:
+    """Query the user-system-index GSI for users linked to a system"""
+    user_ids = []
+    query_kwargs = {
+        'IndexName': 'user-system-index',
+        'KeyConditionExpression': Key('GSI1PK').eq(f'System#{system_id}') & Key('GSI1SK').begins_with('User#'),
+        'ProjectionExpression': 'userId'
+    }
+    
+    while True:
+        response = table.query(**query_kwargs)
+        user_ids.extend(item['userId'] for item in response.get('Items', []) if item.get('userId'))
+        if 'LastEvaluatedKey' not in response:
+            return user_ids
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
 def get_users_with_system_access(system_id: str) -> List[str]:
-    """Get all users who have access to the specified system"""
+    """Get all users who have access to the specified system (cached access map, TTL + version stamp)"""
+    # Always include admin user ID (hardcoded)
+    ADMIN_USER_ID = "04484418-1051-70ea-d0d3-afb45eadb6e7"
+    
     try:
-        # Always include admin user ID (hardcoded)
-        ADMIN_USER_ID = "04484418-1051-70ea-d0d3-afb45eadb6e7"
-        user_ids = [ADMIN_USER_ID]
+        if not access_map['loaded']:
+            load_access_map_snapshot()
+        refresh_access_map_version()
         
-
-        response = table.query(
-            IndexName='user-system-index',  # <- your actual GSI name
-            KeyConditionExpression=Key('GSI1PK').eq(f'System#{system_id}') & Key('GSI1SK').begins_with('User#'),
-        )
-        logger.info(f"Query response: {response}")
+        entry = access_map['systems'].get(system_id)
+        if entry and time.time() - entry['fetchedAt'] < ACCESS_MAP_TTL_SECONDS:
+            linked_user_ids = entry['userIds']
+            logger.info(f"Access map cache hit for system {system_id}")
+        else:
+            linked_user_ids = query_users_with_system_access(system_id)
+            access_map['systems'][system_id] = {'userIds': linked_user_ids, 'fetchedAt': time.time()}
+            save_access_map_snapshot()
         
-        for item in response.get('Items', []):
-            user_id = item.get('userId')
-                # Avoid duplicates in case admin is already in the system access list
-            if user_id not in user_ids:
-                user_ids.append(user_id)
+        # Avoid duplicates in case admin is already in the system access list
+        user_ids = [ADMIN_USER_ID] + [user_id for user_id in dict.fromkeys(linked_user_ids) if user_id != ADMIN_USER_ID]
         
         logger.info(f"Found {len(user_ids)} users with access to system {system_id} (including admin)")
         return user_ids
@@ -69,7 +169,7 @@ def get_users_with_system_access(system_id: str) -> List[str]:
     except Exception as e:
         logger.error(f"Error getting users for system {system_id}: {str(e)}")
         # Even if there's an error, always return admin user ID
-        return ["04484418-1051-70ea-d0d3-afb45eadb6e7"]
+        return [ADMIN_USER_ID]
 
 def get_user_profile(user_id: str) -> Dict[str, Any]:
     """Get user profile data from DynamoDB"""
@@ -110,7 +210,8 @@ def get_user_devices(user_id: str) -> List[Dict[str, Any]]:
                 devices.append({
                     'deviceId': item.get('deviceId'),
                     'pushToken': item.get('pushToken'),
-                    'platform': item.get('platform', 'unknown')
+                    'platform': item.get('platform', 'unknown'),
+                    'key': {'PK': item['PK'], 'SK': item['SK']}
                 })
         
         logger.info(f"Found {len(devices)} active devices for user {user_id}")
@@ -120,6 +221,46 @@ def get_user_devices(user_id: str) -> List[Dict[str, Any]]:
         logger.error(f"Error getting devices for user {user_id}: {str(e)}")
         return []
 
+def get_user_profiles(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Get user profiles for many users with batch_get_item (100 keys per request)"""
+    profiles = {}
+    unique_user_ids = list(dict.fromkeys(user_ids))
+    
+    for i in range(0, len(unique_user_ids), 100):
+        request_items = {
+            table.name: {
+                'Keys': [{'PK': f'User#{user_id}', 'SK': 'PROFILE'} for user_id in unique_user_ids[i:i + 100]]
+            }
+        }
+        
+        attempt = 0
+        while request_items:
+            try:
+                response = dynamodb.batch_get_item(RequestItems=request_items)
+            except Exception as e:
+                logger.error(f"Error batch getting user profiles: {str(e)}")
+                break
+            
+            for item in response.get('Responses', {}).get(table.name, []):
+                profiles[item['PK'].replace('User#', '')] = item
+            
+            # Retry throttled keys with exponential backoff
+            request_items = response.get('UnprocessedKeys') or {}
+            if request_items:
+                attempt += 1
+                if attempt > 5:
+                    logger.error(f"Giving up on {len(request_items[table.name]['Keys'])} unprocessed profile keys")
+                    break
+                time.sleep(0.05 * (2 ** attempt))
+    
+    logger.info(f"Retrieved {len(profiles)} profiles for {len(unique_user_ids)} users")
+    return profiles
+
+def get_devices_for_users(user_ids: List[str], executor: ThreadPoolExecutor) -> Dict[str, List[Dict[str, Any]]]:
+    """Query the logged-in devices of many users in parallel on the caller's executor"""
+    unique_user_ids = list(dict.fromkeys(user_ids))
+    return dict(zip(unique_user_ids, executor.map(get_user_devices, unique_user_ids)))
+
 def get_device_name(device_id: str, pv_system_id: str) -> str:
     """Get device name from DynamoDB, fallback to device ID"""
     try:
@@ -201,56 +342,7 @@ def format_notification_message(display_name: str, new_status: str, previous_sta
         'body': body
     }
 
-def send_expo_notifications(tokens: List[str], title: str, body: str, data: Dict[str, Any]) -> bool:
-    """Sends push notifications to a list of Expo push tokens in a single batch."""
-    messages = []
-    for token in tokens:
-        # Basic validation to ensure it's an Expo token
-        if token.startswith('ExponentPushToken['):
-            messages.append({
-                'to': token,
-                'sound': 'default',
-                'title': title,
-                'body': body,
-                'data': data
-            })
-    
-    if not messages:
-        logger.warning("No valid Expo push tokens to send notifications to.")
-        return True # Return true as there's no error, just no one to notify
-
-    try:
-        response = requests.post(
-            'https://exp.host/--/api/v2/push/send',
-            headers={
-                'Accept': 'application/json',
-                'Accept-encoding': 'gzip, deflate',
-                'Content-Type': 'application/json',
-            },
-            json=messages,
-            timeout=30
-        )
-        response.raise_for_status()
-        
-        response_data = response.json().get('data', [])
-        success_count = sum(1 for ticket in response_data if ticket.get('status') == 'ok')
-        error_count = len(response_data) - success_count
-
-        logger.info(f"✅ Sent notifications to Expo. Success: {success_count}, Errors: {error_count}")
-        
-        # Log detailed errors if any
-        if error_count > 0:
-            for ticket in response_data:
-                if ticket.get('status') == 'error':
-                    logger.error(f"Expo push error: {ticket.get('message')} - Details: {ticket.get('details')}")
-
-        return error_count == 0
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ Error sending notifications to Expo API: {str(e)}")
-        return False
-
-def process_status_change_notification(sns_message: Dict[str, Any]) -> Dict[str, int]:
+def process_status_change_notification(sns_message: Dict[str, Any], message_id: Optional[str] = None) -> Dict[str, int]:
     """Process a device-level status change notification from SNS"""
     stats = {
         'users_found': 0,
@@ -289,34 +381,47 @@ def process_status_change_notification(sns_message: Dict[str, Any]) -> Dict[str,
             logger.warning(f"No users found with access to system {system_id}")
             return stats
 
+        # Load all profiles in one batch and query every user's devices in parallel, on one pool
+        profile_user_ids = [user_id for user_id in user_ids if user_id != "04484418-1051-70ea-d0d3-afb45eadb6e7"]
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_QUERIES, len(user_ids) + 1)) as executor:
+            profiles_future = executor.submit(get_user_profiles, profile_user_ids)
+            devices_by_user = get_devices_for_users(user_ids, executor)
+            user_profiles = profiles_future.result()
+
         # Create incident records for each user (only if they have technician_email)
+        incident_user_ids = []
         for user_id in user_ids:
             if user_id != "04484418-1051-70ea-d0d3-afb45eadb6e7":
-                # Get user profile to check for technician_email
-                user_profile = get_user_profile(user_id)
+                # Check the user profile for technician_email
+                user_profile = user_profiles.get(user_id, {})
                 technician_email = user_profile.get('technician_email', '').strip()
                 
                 if technician_email:  # Check if technician_email exists and is not empty
                     logger.info(f"User {user_id} has technician_email: {technician_email} - creating incident record")
-                    create_incident_record(user_id, system_id, device_id, new_status)
-                    stats['incidents_created'] += 1
+                    incident_user_ids.append(user_id)
                 else:
                     logger.info(f"User {user_id} does not have technician_email - skipping incident record creation")
             else:
                 # Skip admin user for incident creation
                 logger.info(f"Skipping incident creation for admin user {user_id}")
                 stats['errors'] += 1
+        
+        # The status change timestamp (or SNS message id) makes incident ids stable across redeliveries
+        change_key = sns_message.get('timestamp') or message_id
+        stats['incidents_created'] = create_incident_records(incident_user_ids, system_id, device_id, new_status, change_key)
 
-        # Collect all device tokens for all users with access
+        # Collect all device tokens for all users with access, with every Device# item holding each token
         all_expo_tokens = []
+        device_keys = {}
         total_devices = 0
-        for user_id in user_ids:
-            devices = get_user_devices(user_id)
+        for devices in devices_by_user.values():
             total_devices += len(devices)
             for device in devices:
-                # Add token if it's not already in the list
-                if device.get('pushToken') and device['pushToken'] not in all_expo_tokens:
-                    all_expo_tokens.append(device['pushToken'])
+                if device.get('pushToken'):
+                    # Add token if it's not already in the list
+                    if device['pushToken'] not in device_keys:
+                        all_expo_tokens.append(device['pushToken'])
+                    device_keys.setdefault(device['pushToken'], []).append(device['key'])
         
         stats['devices_found'] = total_devices
 
@@ -329,12 +434,15 @@ def process_status_change_notification(sns_message: Dict[str, Any]) -> Dict[str,
             display_name, new_status, previous_status, power, True
         )
         
-        # Send one batch of notifications via Expo
+        # Send notifications via Expo (chunked), pruning tokens of unregistered devices;
+        # receipts are stored and checked by a later invocation
         success = send_expo_notifications(
             tokens=all_expo_tokens,
             title=notification['title'],
             body=notification['body'],
-            data=data_payload
+            data=data_payload,
+            table=table,
+            device_keys=device_keys
         )
         
         if success:
@@ -350,92 +458,89 @@ def process_status_change_notification(sns_message: Dict[str, Any]) -> Dict[str,
         stats['errors'] += 1
         return stats
 
-def create_incident_record(user_id: str, system_id: str, device_id: str, new_status: str, max_retries: int = 3) -> bool:
-    """Create an incident record in DynamoDB with retry logic"""
-    incident_id = str(uuid.uuid4())
+def get_incident_id(device_id: str, change_key: Optional[str], user_id: str) -> str:
+    """Deterministic incident id for a (device, status change, user) triple"""
+    if not change_key:
+        # Nothing identifies the status change, so redeliveries cannot be recognised
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(INCIDENT_ID_NAMESPACE, f"{device_id}#{change_key}#{user_id}"))
+
+def build_incident_record(incident_id: str, user_id: str, system_id: str, device_id: str, new_status: str) -> Dict[str, Any]:
+    """Build an incident record queued for technician escalation
+    
+    The record carries its escalation due time in the sparse incident-escalation-index
+    (GSI4PK = due-time bucket, GSI4SK = due epoch); the notify_technician sweeper picks
+    it up from there once due instead of a per-incident EventBridge schedule.
+    """
     expires_at = int((datetime.utcnow() + timedelta(hours=1)).timestamp())
+    escalation_due_at = int(time.time()) + ESCALATION_DELAY_MINUTES * 60
     
-    incident_record = {
+    return {
         'PK': f'Incident#{incident_id}',
         'SK': f'User#{user_id}',
         'userId': user_id,
         'systemId': system_id,
         'deviceId': device_id,
         'GSI3PK': f'User#{user_id}',
+        'GSI4PK': get_escalation_bucket(escalation_due_at),
+        'GSI4SK': escalation_due_at,
         'status': 'pending',
         'expiresAt': expires_at,
         'newStatus': new_status
     }
-    
-    for attempt in range(max_retries):
-        try:
-            table.put_item(Item=incident_record)
-            logger.info(f"✅ Created incident record {incident_id} for user {user_id}")
-            
-            # Create EventBridge scheduler for technician notification in 1 hour
-            if create_technician_schedule(incident_id, user_id):
-                logger.info(f"✅ Created EventBridge schedule for incident {incident_id}")
-            else:
-                logger.warning(f"⚠️ Failed to create EventBridge schedule for incident {incident_id}")
-            
-            return True
-        except Exception as e:
-            logger.warning(f"Attempt {attempt + 1}/{max_retries} failed to create incident record: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(0.5 * (2 ** attempt))  # Exponential backoff
-            else:
-                logger.error(f"❌ Failed to create incident record after {max_retries} attempts: {str(e)}")
-                return False
-    
-    return False
 
-def create_technician_schedule(incident_id: str, user_id: str, max_retries: int = 3) -> bool:
-    """Create a one-time EventBridge schedule to trigger technician notification in 1 hour"""
-    schedule_name = f"incident-{incident_id[:8]}-user-{user_id[:8]}"
-    
-    # Calculate schedule time (1 hour from now)
-    #schedule_time = datetime.utcnow() + timedelta(hours=1)
-    schedule_time = datetime.utcnow() + timedelta(minutes=2)
-    schedule_expression = f"at({schedule_time.strftime('%Y-%m-%dT%H:%M:%S')})"
+def create_incident_records(user_ids: List[str], system_id: str, device_id: str, new_status: str,
+                            change_key: Optional[str], max_retries: int = 3) -> int:
+    """Create incident records for several users in one transaction per 100 users
     
-    # Get the notify_technician Lambda function ARN from environment
-    technician_lambda_arn = os.environ.get('NOTIFY_TECHNICIAN_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:381492109487:function:lambda_notify_technician')
-    if not technician_lambda_arn:
-        logger.error("NOTIFY_TECHNICIAN_LAMBDA_ARN environment variable not set")
-        return False
+    Each put is conditional on the incident not existing yet, so a redelivered status
+    change creates nothing. Returns the number of newly created incidents.
+    """
+    records = [
+        build_incident_record(get_incident_id(device_id, change_key, user_id), user_id, system_id, device_id, new_status)
+        for user_id in dict.fromkeys(user_ids)
+    ]
+    created = 0
     
-    for attempt in range(max_retries):
-        try:
-            response = scheduler.create_schedule(
-                Name=schedule_name,
-                ScheduleExpression=schedule_expression,
-                Target={
-                    'Arn': technician_lambda_arn,
-                    'RoleArn': os.environ.get('EVENTBRIDGE_EXECUTION_ROLE_ARN', 'arn:aws:iam::381492109487:role/EventBridgeSchedulerExecutionRole'),
-                    'Input': json.dumps({
-                        'incident_id': incident_id,
-                        'user_id': user_id
-                    })
-                },
-                FlexibleTimeWindow={
-                    'Mode': 'OFF'
-                },
-                State='ENABLED',
-                Description=f'One-time schedule for incident {incident_id} technician notification'
-            )
-            
-            logger.info(f"✅ Created EventBridge schedule {schedule_name} for {schedule_time}")
-            return True
+    for i in range(0, len(records), 100):
+        pending = records[i:i + 100]
+        
+        attempt = 0
+        while pending:
+            try:
+                dynamodb.meta.client.transact_write_items(TransactItems=[{
+                    'Put': {
+                        'TableName': table.name,
+                        'Item': record,
+                        'ConditionExpression': 'attribute_not_exists(PK)'
+                    }
+                } for record in pending])
+                created += len(pending)
+                for record in pending:
+                    logger.info(f"✅ Created incident record {record['PK']} for user {record['userId']}, escalation due in {ESCALATION_DELAY_MINUTES} min")
+                break
+                
+            except dynamodb.meta.client.exceptions.TransactionCanceledException as e:
+                # Drop incidents that already exist (redelivery) and retry the rest right away
+                reasons = e.response.get('CancellationReasons', [])
+                duplicates = [record for record, reason in zip(pending, reasons) if reason.get('Code') == 'ConditionalCheckFailed']
+                if duplicates:
+                    for record in duplicates:
+                        logger.info(f"Incident record {record['PK']} already exists - skipping duplicate")
+                    pending = [record for record in pending if record not in duplicates]
+                    continue
+                logger.warning(f"Attempt {attempt + 1}/{max_retries} failed to create incident records: {str(e)}")
+                    
+            except Exception as e:
+                logger.warning(f"Attempt {attempt + 1}/{max_retries} failed to create incident records: {str(e)}")
             
-        except Exception as e:
-            logger.warning(f"Attempt {attempt + 1}/{max_retries} failed to create EventBridge schedule: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(0.5 * (2 ** attempt))  # Exponential backoff
-            else:
-                logger.error(f"❌ Failed to create EventBridge schedule after {max_retries} attempts: {str(e)}")
-                return False
+            attempt += 1
+            if attempt >= max_retries:
+                logger.error(f"❌ Failed to create {len(pending)} incident records after {max_retries} attempts")
+                break
+            time.sleep(0.1 * (2 ** attempt))  # Exponential backoff for the whole batch
     
-    return False
+    return created
 
 def lambda_handler(event, context):
     """AWS Lambda handler function triggered by SNS"""
@@ -459,7 +564,7 @@ def lambda_handler(event, context):
                     sns_message = json.loads(record['Sns']['Message'])
                     
                     # Process the status change
-                    stats = process_status_change_notification(sns_message)
+                    stats = process_status_change_notification(sns_message, record['Sns'].get('MessageId'))
                     
                     # Aggregate stats
                     total_stats['messages_processed'] += 1
@@ -473,6 +578,9 @@ def lambda_handler(event, context):
                     logger.error(f"Error processing SNS record: {str(e)}")
                     total_stats['errors'] += 1
         
+        # Receipts of earlier sends are ready by now
+        total_stats['push_tokens_pruned'] = check_pending_receipts(table)
+        
         logger.info("=== NOTIFICATION PROCESSING COMPLETED ===")
         logger.info(f"📨 Messages processed: {total_stats['messages_processed']}")
         logger.info(f"👥 Users found: {total_stats['users_found']}")
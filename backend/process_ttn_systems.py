@@ -3,7 +3,7 @@ TTN System Processing Script
 
 This script queries the Moose DynamoDB table for system profiles where PK begins with "System#" 
 and SK = "PROFILE". For systems where the name starts with "TTN", it creates user-to-system 
-link entries in the database.
+link entries in the database and bumps the access map version so cached links are refreshed.
 
 Usage:
     python process_ttn_systems.py
@@ -15,6 +15,7 @@ import logging
 import boto3
 from typing import List, Dict, Any
 from botocore.exceptions import ClientError
+from system_registry import bump_access_map_version
 
 # Set up logging
 logging.basicConfig(
@@ -168,7 +169,11 @@ def process_ttn_systems():
             else:
                 failed_additions += 1
         
-        # Step 4: Report results
+        # Step 4: Invalidate cached user-system access maps
+        if successful_additions:
+            bump_access_map_version(table)
+        
+        # Step 5: Report results
         logger.info("=" * 50)
         logger.info("PROCESSING COMPLETE")
         logger.info("=" * 50)
@@ -0,0 +1,177 @@
+"""
+System Registry and Access Map Helpers
+
+Shared helpers used by app.py, user_management_lambda.py, load_db.py and
+process_ttn_systems.py for the two bookkeeping items in the Moose-DDB table.
+
+Key Features:
+- PK: Registry / SK: SYSTEMS holds the ID of every System# PROFILE item, so admin
+  system listings need one get_item instead of a table scan
+- add_to_system_registry() is called wherever a system PROFILE item is written
+- get_all_system_ids() caches the registry in memory and rebuilds it from the
+  PROFILE items when it is missing or has not been rebuilt for
+  SYSTEM_REGISTRY_REBUILD_SECONDS, so systems written by other tools still appear
+- PK: AccessMap / SK: VERSION is bumped whenever user-system links or devices
+  change, so notify_user drops its cached user-system links
+
+Usage:
+- Include this file in the deployment package of every Lambda that imports it.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger('system_registry')
+
+SYSTEM_REGISTRY_KEY = {'PK': 'Registry', 'SK': 'SYSTEMS'}
+ACCESS_MAP_VERSION_KEY = {'PK': 'AccessMap', 'SK': 'VERSION'}
+
+# How long a process reuses the registry it read, and how old the last full
+# rebuild may get before the registry is rebuilt from the PROFILE items
+SYSTEM_REGISTRY_TTL_SECONDS = int(os.environ.get('SYSTEM_REGISTRY_TTL_SECONDS', '300'))
+SYSTEM_REGISTRY_REBUILD_SECONDS = int(os.environ.get('SYSTEM_REGISTRY_REBUILD_SECONDS', '86400'))
+
+system_registry_cache = {
+    'systemIds': None,
+    'fetchedAt': 0.0
+}
+
+
+def add_to_system_registry(table, system_ids: List[str]) -> bool:
+    """Add system IDs to the registry item, creating it if needed"""
+    if not system_ids:
+        return True
+
+    try:
+        table.update_item(
+            Key=SYSTEM_REGISTRY_KEY,
+            UpdateExpression='ADD systemIds :ids SET updatedAt = :now',
+            ExpressionAttributeValues={
+                ':ids': set(system_ids),
+                ':now': datetime.utcnow().isoformat()
+            }
+        )
+        system_registry_cache['systemIds'] = None
+        return True
+
+    except Exception as e:
+        logger.error(f"Error adding {len(system_ids)} systems to the system registry: {str(e)}")
+        return False
+
+
+def rebuild_system_registry(table, seen_updated_at: Optional[str] = None) -> List[str]:
+    """
+    Rebuild the registry item from the System# PROFILE items.
+
+    The rebuild replaces the stored set only if no add landed since the registry
+    was read (seen_updated_at); otherwise the scanned IDs are added to it instead.
+    """
+    system_ids = set()
+    scan_kwargs = {
+        'FilterExpression': 'begins_with(PK, :pk) AND SK = :sk',
+        'ProjectionExpression': 'PK',
+        'ExpressionAttributeValues': {
+            ':pk': 'System#',
+            ':sk': 'PROFILE'
+        }
+    }
+
+    while True:
+        response = table.scan(**scan_kwargs)
+        system_ids.update(item['PK'].replace('System#', '') for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    now = datetime.utcnow().isoformat()
+    values = {':now': now}
+    # DynamoDB rejects empty sets
+    if system_ids:
+        values[':ids'] = system_ids
+        update_expression = 'SET systemIds = :ids, updatedAt = :now, rebuiltAt = :now'
+    else:
+        update_expression = 'SET updatedAt = :now, rebuiltAt = :now REMOVE systemIds'
+
+    if seen_updated_at is None:
+        condition = 'attribute_not_exists(updatedAt)'
+    else:
+        condition = 'updatedAt = :seen'
+        values[':seen'] = seen_updated_at
+
+    try:
+        table.update_item(
+            Key=SYSTEM_REGISTRY_KEY,
+            UpdateExpression=update_expression,
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # A system was added while scanning - keep it and merge the scan in
+        logger.info("System registry changed during rebuild, merging instead of replacing")
+        table.update_item(
+            Key=SYSTEM_REGISTRY_KEY,
+            UpdateExpression='SET rebuiltAt = :now' + (' ADD systemIds :ids' if system_ids else ''),
+            ExpressionAttributeValues={k: v for k, v in values.items() if k != ':seen'}
+        )
+        response = table.get_item(Key=SYSTEM_REGISTRY_KEY, ProjectionExpression='systemIds')
+        system_ids = response.get('Item', {}).get('systemIds', system_ids)
+
+    logger.info(f"Rebuilt system registry with {len(system_ids)} systems")
+    return sorted(system_ids)
+
+
+def registry_is_stale(item: dict) -> bool:
+    """True if the registry item has never been rebuilt or was rebuilt too long ago"""
+    rebuilt_at = item.get('rebuiltAt')
+    if not rebuilt_at:
+        return True
+    try:
+        age = datetime.utcnow() - datetime.fromisoformat(rebuilt_at)
+    except ValueError:
+        return True
+    return age > timedelta(seconds=SYSTEM_REGISTRY_REBUILD_SECONDS)
+
+
+def get_all_system_ids(table) -> List[str]:
+    """Get every system ID from the registry item, cached in memory for SYSTEM_REGISTRY_TTL_SECONDS"""
+    if (system_registry_cache['systemIds'] is not None and
+            time.time() - system_registry_cache['fetchedAt'] < SYSTEM_REGISTRY_TTL_SECONDS):
+        return list(system_registry_cache['systemIds'])
+
+    response = table.get_item(
+        Key=SYSTEM_REGISTRY_KEY,
+        ProjectionExpression='systemIds, updatedAt, rebuiltAt'
+    )
+    item = response.get('Item')
+    if item is None or registry_is_stale(item):
+        # Missing, or long enough since the last rebuild that systems written
+        # without add_to_system_registry could be missing from it
+        system_ids = rebuild_system_registry(table, item.get('updatedAt') if item else None)
+    else:
+        system_ids = sorted(item.get('systemIds', set()))
+
+    system_registry_cache['systemIds'] = system_ids
+    system_registry_cache['fetchedAt'] = time.time()
+    return list(system_ids)
+
+
+def bump_access_map_version(table) -> None:
+    """Bump the access map version so notify_user drops its cached user-system links"""
+    try:
+        table.update_item(
+            Key=ACCESS_MAP_VERSION_KEY,
+            UpdateExpression='ADD version :one SET updatedAt = :now',
+            ExpressionAttributeValues={
+                ':one': 1,
+                ':now': datetime.utcnow().isoformat()
+            }
+        )
+    except Exception as e:
+        logger.warning(f"Failed to bump access map version: {str(e)}")
@@ -7,7 +7,6 @@ Processes technician responses from Google Forms and sends notifications to user
 import os
 import json
 import boto3
-import requests
 from datetime import datetime
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
@@ -15,7 +14,10 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from mangum import Mangum
+from expo_push import send_expo_notifications
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, TimeoutError as FutureTimeoutError
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +27,12 @@ logger = logging.getLogger(__name__)
 AWS_REGION = os.environ.get('AWS_REGION_', 'us-east-1')
 DYNAMODB_TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME', 'Moose-DDB')
 
+# Shared time budget for user lookups plus email/push delivery
+DELIVERY_TIMEOUT_SECONDS = float(os.environ.get('DELIVERY_TIMEOUT_SECONDS', '10'))
+
+# Reused across warm invocations for the parallel lookups and channel dispatch
+executor = ThreadPoolExecutor(max_workers=4)
+
 # Initialize AWS clients
 try:
     dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
@@ -125,7 +133,8 @@ def get_user_devices(user_id: str) -> List[Dict[str, Any]]:
                 devices.append({
                     'deviceId': item.get('device_id', item.get('SK', '').replace('Device#', '')),
                     'pushToken': item.get('expo_push_token'),
-                    'platform': item.get('platform', 'unknown')
+                    'platform': item.get('platform', 'unknown'),
+                    'key': {'PK': item['PK'], 'SK': item['SK']}
                 })
         
         logger.info(f"Found {len(devices)} active devices for user {user_id}")
@@ -164,55 +173,6 @@ def send_user_email(email: str, subject: str, body: str) -> bool:
         logger.error(f"❌ Failed to send email to {email}: {str(e)}")
         return False
 
-def send_expo_notifications(tokens: List[str], title: str, body: str, data: Dict[str, Any]) -> bool:
-    """Sends push notifications to a list of Expo push tokens - COPIED from notify_user.py"""
-    messages = []
-    for token in tokens:
-        # Basic validation to ensure it's an Expo token
-        if token.startswith('ExponentPushToken['):
-            messages.append({
-                'to': token,
-                'sound': 'default',
-                'title': title,
-                'body': body,
-                'data': data
-            })
-    
-    if not messages:
-        logger.warning("No valid Expo push tokens to send notifications to.")
-        return True # Return true as there's no error, just no one to notify
-
-    try:
-        response = requests.post(
-            'https://exp.host/--/api/v2/push/send',
-            headers={
-                'Accept': 'application/json',
-                'Accept-encoding': 'gzip, deflate',
-                'Content-Type': 'application/json',
-            },
-            json=messages,
-            timeout=30
-        )
-        response.raise_for_status()
-        
-        response_data = response.json().get('data', [])
-        success_count = sum(1 for ticket in response_data if ticket.get('status') == 'ok')
-        error_count = len(response_data) - success_count
-
-        logger.info(f"✅ Sent notifications to Expo. Success: {success_count}, Errors: {error_count}")
-        
-        # Log detailed errors if any
-        if error_count > 0:
-            for ticket in response_data:
-                if ticket.get('status') == 'error':
-                    logger.error(f"Expo push error: {ticket.get('message')} - Details: {ticket.get('details')}")
-
-        return error_count == 0
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ Error sending notifications to Expo API: {str(e)}")
-        return False
-
 def format_technician_response_email(tech_response: TechnicianResponse) -> Dict[str, str]:
     """Format email subject and body for technician response notification"""
     
@@ -297,8 +257,58 @@ def format_technician_response_notification(tech_response: TechnicianResponse) -
         'body': body
     }
 
+def send_email_notification(user_email: str, tech_response: TechnicianResponse) -> bool:
+    """Email channel of the technician response notification"""
+    email_content = format_technician_response_email(tech_response)
+    email_sent = send_user_email(
+        user_email,
+        email_content['subject'],
+        email_content['body']
+    )
+    if email_sent:
+        logger.info(f"✅ Email sent to {user_email}")
+    else:
+        logger.error(f"❌ Failed to send email to {user_email}")
+    return email_sent
+
+def send_push_notification(user_devices: List[Dict[str, Any]], tech_response: TechnicianResponse) -> bool:
+    """Push channel of the technician response notification"""
+    device_keys = {}
+    for device in user_devices:
+        if device.get('pushToken'):
+            device_keys.setdefault(device['pushToken'], []).append(device['key'])
+    push_tokens = list(device_keys)
+    notification_content = format_technician_response_notification(tech_response)
+    data_payload = {
+        'type': 'technician_response',
+        'userId': tech_response.userId,
+        'accepted': tech_response.accepted,
+        'timestamp': tech_response.timestamp
+    }
+    
+    # Ticket ids are stored for the receipts pass in notify_user; tokens rejected
+    # outright as DeviceNotRegistered are pruned right away
+    push_sent = send_expo_notifications(
+        push_tokens,
+        notification_content['title'],
+        notification_content['body'],
+        data_payload,
+        table=table,
+        device_keys=device_keys
+    )
+    if push_sent:
+        logger.info(f"✅ Push notifications sent to {len(push_tokens)} devices")
+    else:
+        logger.error(f"❌ Failed to send push notifications")
+    return push_sent
+
 def process_technician_response(tech_response: TechnicianResponse) -> ProcessingResult:
-    """Process technician response and send notifications to user"""
+    """Process technician response and send notifications to user
+    
+    Profile and device reads run in parallel, then email and push are dispatched
+    concurrently and share one DELIVERY_TIMEOUT_SECONDS budget; a channel that has
+    not finished by the deadline is reported as not sent.
+    """
     result = ProcessingResult(
         success=False,
         message="Processing started",
@@ -306,8 +316,13 @@ def process_technician_response(tech_response: TechnicianResponse) -> Processing
     )
     
     try:
-        # Step 1: Check if user exists
-        user_profile = get_user_profile(tech_response.userId)
+        deadline = time.monotonic() + DELIVERY_TIMEOUT_SECONDS
+        
+        # Step 1: Load user profile and devices in parallel
+        profile_future = executor.submit(get_user_profile, tech_response.userId)
+        devices_future = executor.submit(get_user_devices, tech_response.userId)
+        
+        user_profile = profile_future.result(timeout=max(0.0, deadline - time.monotonic()))
         if not user_profile:
             result.message = f"User {tech_response.userId} not found - ending processing"
             result.success = True  # Not an error, just no user to notify
@@ -317,8 +332,9 @@ def process_technician_response(tech_response: TechnicianResponse) -> Processing
         logger.info(f"Processing technician response for user {tech_response.userId}")
         
         # Step 2: Get user email and devices
-        user_email = user_profile.get('email')
-        user_devices = get_user_devices(tech_response.userId)
+        user_email = (user_profile.get('email') or '').strip()
+        user_devices = devices_future.result(timeout=max(0.0, deadline - time.monotonic()))
+        has_push_tokens = any(device.get('pushToken') for device in user_devices)
         
         # Step 3: Check if we have email or devices
         if not user_email and not user_devices:
@@ -327,53 +343,35 @@ def process_technician_response(tech_response: TechnicianResponse) -> Processing
             logger.warning(result.message)
             return result
         
-        # Step 4: Send email if user has email
-        email_sent = False
-        if user_email and user_email.strip():
-            email_content = format_technician_response_email(tech_response)
-            email_sent = send_user_email(
-                user_email.strip(),
-                email_content['subject'],
-                email_content['body']
-            )
-            result.email_sent = email_sent
-            if email_sent:
-                logger.info(f"✅ Email sent to {user_email}")
-            else:
-                logger.error(f"❌ Failed to send email to {user_email}")
+        # Step 4: Dispatch email and push notifications concurrently
+        channel_futures = {}
+        if user_email:
+            channel_futures['email'] = executor.submit(send_email_notification, user_email, tech_response)
         else:
             logger.info("No email address found - skipping email notification")
         
-        # Step 5: Send push notifications if user has devices
-        push_sent = False
-        if user_devices:
-            push_tokens = [device['pushToken'] for device in user_devices if device.get('pushToken')]
-            if push_tokens:
-                notification_content = format_technician_response_notification(tech_response)
-                data_payload = {
-                    'type': 'technician_response',
-                    'userId': tech_response.userId,
-                    'accepted': tech_response.accepted,
-                    'timestamp': tech_response.timestamp
-                }
-                
-                push_sent = send_expo_notifications(
-                    push_tokens,
-                    notification_content['title'],
-                    notification_content['body'],
-                    data_payload
-                )
-                result.push_sent = push_sent
-                if push_sent:
-                    logger.info(f"✅ Push notifications sent to {len(push_tokens)} devices")
-                else:
-                    logger.error(f"❌ Failed to send push notifications")
-            else:
-                logger.info("No valid push tokens found - skipping push notifications")
+        if has_push_tokens:
+            channel_futures['push'] = executor.submit(send_push_notification, user_devices, tech_response)
+        elif user_devices:
+            logger.info("No valid push tokens found - skipping push notifications")
         else:
             logger.info("No devices found - skipping push notifications")
         
-        # Step 6: Determine overall success
+        done, not_done = wait(list(channel_futures.values()), timeout=max(0.0, deadline - time.monotonic()))
+        for channel, future in channel_futures.items():
+            if future in not_done:
+                logger.error(f"❌ {channel} delivery did not finish within {DELIVERY_TIMEOUT_SECONDS}s")
+        
+        def channel_sent(channel: str) -> bool:
+            future = channel_futures.get(channel)
+            return bool(future and future in done and not future.exception() and future.result())
+        
+        email_sent = channel_sent('email')
+        push_sent = channel_sent('push')
+        result.email_sent = email_sent
+        result.push_sent = push_sent
+        
+        # Step 5: Determine overall success
         if user_email and user_devices:
             # User has both email and devices - both should succeed
             result.success = email_sent and push_sent
@@ -392,6 +390,11 @@ def process_technician_response(tech_response: TechnicianResponse) -> Processing
         
         return result
         
+    except FutureTimeoutError:
+        logger.error(f"❌ User lookups did not finish within {DELIVERY_TIMEOUT_SECONDS}s")
+        result.message = "Processing error: user lookup timed out"
+        result.success = False
+        return result
     except Exception as e:
         logger.error(f"❌ Error processing technician response: {str(e)}")
         result.message = f"Processing error: {str(e)}"
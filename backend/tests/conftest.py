@@ -0,0 +1,17 @@
+"""Shared pytest setup: make the Lambda modules importable and keep them off AWS."""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+for path in (BACKEND_DIR, TESTS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# boto3 clients are created at import time; give them a region and dummy
+# credentials so no test can reach a real account
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ['AWS_SESSION_TOKEN'] = 'testing'
@@ -0,0 +1,382 @@
+"""
+In-memory stand-in for the Moose-DDB table, used by the Lambda tests.
+
+Evaluates the condition, key-condition and update expressions the code sends
+(boto3 Key/Attr conditions or expression strings), so conditional writes and
+GSI queries behave like DynamoDB without AWS access. Only the features the
+Lambdas use are supported.
+"""
+
+import copy
+import re
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from botocore.exceptions import ClientError
+
+TOKEN_PATTERN = re.compile(r'\s*(<>|<=|>=|[=<>(),+\-]|[:#]?[A-Za-z_][A-Za-z0-9_.]*|\d+)')
+
+
+def client_error(code: str, operation: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+def tokenize(expression: str) -> list:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if not match:
+            raise ValueError(f"Cannot parse expression at: {expression[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class ExpressionContext:
+    """Resolves #names and :values of one request"""
+
+    def __init__(self, names=None, values=None):
+        self.names = names or {}
+        self.values = values or {}
+
+    def attribute(self, token: str) -> str:
+        return self.names.get(token, token)
+
+    def operand(self, token: str, item: dict):
+        if token.startswith(':'):
+            return self.values[token]
+        if token.isdigit():
+            return int(token)
+        return item.get(self.attribute(token))
+
+
+class ConditionParser:
+    """Recursive-descent evaluator for DynamoDB condition expressions"""
+
+    FUNCTIONS = ('attribute_exists', 'attribute_not_exists', 'contains', 'begins_with')
+    COMPARATORS = ('=', '<>', '<', '<=', '>', '>=')
+
+    def __init__(self, expression: str, context: ExpressionContext, item: dict):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.context = context
+        self.item = item
+
+    def evaluate(self) -> bool:
+        result = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected token {self.tokens[self.position]!r}")
+        return result
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if expected is not None and (token is None or token.upper() != expected):
+            raise ValueError(f"Expected {expected!r}, got {token!r}")
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        result = self.parse_and()
+        while self.peek() and self.peek().upper() == 'OR':
+            self.take()
+            right = self.parse_and()
+            result = result or right
+        return result
+
+    def parse_and(self):
+        result = self.parse_not()
+        while self.peek() and self.peek().upper() == 'AND':
+            self.take()
+            right = self.parse_not()
+            result = result and right
+        return result
+
+    def parse_not(self):
+        if self.peek() and self.peek().upper() == 'NOT':
+            self.take()
+            return not self.parse_not()
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.take()
+        if token == '(':
+            result = self.parse_or()
+            self.take(')')
+            return result
+
+        if token in self.FUNCTIONS:
+            self.take('(')
+            attribute = self.context.attribute(self.take())
+            argument = None
+            if self.peek() == ',':
+                self.take()
+                argument = self.context.operand(self.take(), self.item)
+            self.take(')')
+            value = self.item.get(attribute)
+            if token == 'attribute_exists':
+                return attribute in self.item
+            if token == 'attribute_not_exists':
+                return attribute not in self.item
+            if token == 'contains':
+                return value is not None and argument in value
+            return isinstance(value, str) and value.startswith(argument)
+
+        left = self.context.operand(token, self.item)
+        comparator = self.take()
+        if comparator.upper() == 'BETWEEN':
+            low = self.context.operand(self.take(), self.item)
+            self.take('AND')
+            high = self.context.operand(self.take(), self.item)
+            return left is not None and low <= left <= high
+        if comparator not in self.COMPARATORS:
+            raise ValueError(f"Unsupported comparator {comparator!r}")
+        right = self.context.operand(self.take(), self.item)
+        if comparator == '=':
+            return left == right
+        if comparator == '<>':
+            return left != right
+        if left is None or right is None:
+            return False
+        return {
+            '<': left < right,
+            '<=': left <= right,
+            '>': left > right,
+            '>=': left >= right
+        }[comparator]
+
+
+def build_condition(condition, names=None, values=None, is_key_condition=False):
+    """Turn a boto3 condition object or an expression string into (expression, context)"""
+    if isinstance(condition, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(condition, is_key_condition=is_key_condition)
+        names = {**(names or {}), **built.attribute_name_placeholders}
+        values = {**(values or {}), **built.attribute_value_placeholders}
+        condition = built.condition_expression
+    return condition, ExpressionContext(names, values)
+
+
+def matches(item: dict, condition, names=None, values=None, is_key_condition=False) -> bool:
+    if condition is None:
+        return True
+    expression, context = build_condition(condition, names, values, is_key_condition)
+    return ConditionParser(expression, context, item).evaluate()
+
+
+def split_top_level(text: str) -> list:
+    parts, depth, current = [], 0, ''
+    for char in text:
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def apply_update(item: dict, expression: str, context: ExpressionContext) -> set:
+    """Apply a SET/ADD/REMOVE/DELETE update expression in place, returning the updated attributes"""
+    clauses = re.split(r'\b(SET|ADD|REMOVE|DELETE)\b', expression)
+    updated = set()
+    for action, body in zip(clauses[1::2], clauses[2::2]):
+        for part in split_top_level(body):
+            if action == 'REMOVE':
+                attribute = context.attribute(part)
+                item.pop(attribute, None)
+                updated.add(attribute)
+                continue
+
+            if action == 'SET':
+                target, value = [side.strip() for side in part.split('=', 1)]
+                attribute = context.attribute(target)
+                item[attribute] = evaluate_set_value(value, item, context)
+            else:
+                target, value = part.split(None, 1)
+                attribute = context.attribute(target)
+                operand = context.values[value.strip()]
+                current = item.get(attribute)
+                if action == 'ADD':
+                    if isinstance(operand, (set, frozenset)):
+                        item[attribute] = set(current or set()) | set(operand)
+                    else:
+                        item[attribute] = (current or 0) + operand
+                else:
+                    remaining = set(current or set()) - set(operand)
+                    if remaining:
+                        item[attribute] = remaining
+                    else:
+                        item.pop(attribute, None)
+            updated.add(attribute)
+    return updated
+
+
+def evaluate_set_value(value: str, item: dict, context: ExpressionContext):
+    function = re.match(r'(if_not_exists|list_append)\((.*)\)$', value)
+    if function:
+        first, second = split_top_level(function.group(2))
+        if function.group(1) == 'if_not_exists':
+            existing = item.get(context.attribute(first))
+            return existing if existing is not None else context.operand(second, item)
+        return list(context.operand(first, item) or []) + list(context.operand(second, item) or [])
+
+    arithmetic = re.match(r'(\S+)\s*([+-])\s*(\S+)$', value)
+    if arithmetic:
+        left = context.operand(arithmetic.group(1), item) or 0
+        right = context.operand(arithmetic.group(3), item) or 0
+        return left + right if arithmetic.group(2) == '+' else left - right
+    return context.operand(value, item)
+
+
+def project(item: dict, projection, names=None):
+    if not projection:
+        return copy.deepcopy(item)
+    attributes = [(names or {}).get(part.strip(), part.strip()) for part in projection.split(',')]
+    return {attribute: copy.deepcopy(item[attribute]) for attribute in attributes if attribute in item}
+
+
+class FakeTable:
+    """Single-table stand-in keyed by (PK, SK), with GSIs given as {name: (hash, range)}"""
+
+    def __init__(self, name='Moose-DDB', indexes=None):
+        self.name = name
+        self.indexes = indexes or {}
+        self.items = {}
+        self.calls = []
+
+    def key_of(self, key: dict) -> tuple:
+        return (key['PK'], key['SK'])
+
+    def seed(self, *items):
+        for item in items:
+            self.items[self.key_of(item)] = copy.deepcopy(item)
+
+    def item(self, pk, sk):
+        return self.items.get((pk, sk))
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self.calls.append(('get_item', Key))
+        item = self.items.get(self.key_of(Key))
+        return {'Item': project(item, ProjectionExpression, ExpressionAttributeNames)} if item else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        self.calls.append(('put_item', self.key_of(Item)))
+        existing = self.items.get(self.key_of(Item), {})
+        if not matches(existing, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+            raise client_error('ConditionalCheckFailedException', 'PutItem')
+        self.items[self.key_of(Item)] = copy.deepcopy(Item)
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self.calls.append(('delete_item', Key))
+        self.items.pop(self.key_of(Key), None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        self.calls.append(('update_item', Key))
+        existing = self.items.get(self.key_of(Key))
+        item = copy.deepcopy(existing) if existing else dict(Key)
+        if not matches(existing or {}, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+            raise client_error('ConditionalCheckFailedException', 'UpdateItem')
+
+        updated = apply_update(item, UpdateExpression, ExpressionContext(ExpressionAttributeNames, ExpressionAttributeValues))
+        self.items[self.key_of(Key)] = item
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': copy.deepcopy(item)}
+        if ReturnValues == 'UPDATED_NEW':
+            return {'Attributes': {name: copy.deepcopy(item[name]) for name in updated if name in item}}
+        return {}
+
+    def query(self, KeyConditionExpression, IndexName=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, FilterExpression=None, ExclusiveStartKey=None,
+              Limit=None, ScanIndexForward=True, ProjectionExpression=None, **kwargs):
+        self.calls.append(('query', IndexName))
+        hash_key, range_key = self.indexes[IndexName] if IndexName else ('PK', 'SK')
+        candidates = [
+            item for item in self.items.values()
+            if hash_key in item and matches(item, KeyConditionExpression, ExpressionAttributeNames,
+                                            ExpressionAttributeValues, is_key_condition=True)
+        ]
+        candidates.sort(key=lambda item: (item.get(range_key) is None, item.get(range_key), item['PK'], item['SK']),
+                        reverse=not ScanIndexForward)
+        if ExclusiveStartKey:
+            keys = [self.key_of(item) for item in candidates]
+            candidates = candidates[keys.index(self.key_of(ExclusiveStartKey)) + 1:]
+
+        page = candidates[:Limit] if Limit else candidates
+        response = {'Items': [
+            project(item, ProjectionExpression, ExpressionAttributeNames) for item in page
+            if matches(item, FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        ]}
+        if Limit and len(candidates) > Limit:
+            response['LastEvaluatedKey'] = {'PK': page[-1]['PK'], 'SK': page[-1]['SK']}
+        return response
+
+    def scan(self, FilterExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+             ProjectionExpression=None, ExclusiveStartKey=None, **kwargs):
+        self.calls.append(('scan', None))
+        return {'Items': [
+            project(item, ProjectionExpression, ExpressionAttributeNames) for item in self.items.values()
+            if matches(item, FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        ]}
+
+
+class FakeClient:
+    """The low-level calls made through dynamodb.meta.client"""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def transact_write_items(self, TransactItems):
+        staged = {name: copy.deepcopy(table.items) for name, table in self.tables.items()}
+        for entry in TransactItems:
+            update = entry['Update']
+            table = self.tables[update['TableName']]
+            key = table.key_of(update['Key'])
+            existing = staged[table.name].get(key)
+            if not matches(existing or {}, update.get('ConditionExpression'),
+                           update.get('ExpressionAttributeNames'), update.get('ExpressionAttributeValues')):
+                raise client_error('TransactionCanceledException', 'TransactWriteItems')
+            item = copy.deepcopy(existing) if existing else dict(update['Key'])
+            apply_update(item, update['UpdateExpression'],
+                         ExpressionContext(update.get('ExpressionAttributeNames'), update.get('ExpressionAttributeValues')))
+            staged[table.name][key] = item
+        for name, items in staged.items():
+            self.tables[name].items = items
+        return {}
+
+
+class FakeMeta:
+    def __init__(self, client):
+        self.client = client
+
+
+class FakeResource:
+    """The resource-level calls made on the module's boto3 dynamodb resource"""
+
+    def __init__(self, *tables):
+        self.tables = {table.name: table for table in tables}
+        self.meta = FakeMeta(FakeClient(self.tables))
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            responses[name] = [
+                project(table.items[table.key_of(key)], request.get('ProjectionExpression'),
+                        request.get('ExpressionAttributeNames'))
+                for key in request['Keys'] if table.key_of(key) in table.items
+            ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
@@ -0,0 +1,125 @@
+"""
+User-to-system access map cache tests (notify_user.get_users_with_system_access)
+against a stubbed table.
+
+Run from the backend directory: python -m pytest tests
+"""
+
+import pytest
+
+import notify_user
+from fake_dynamodb import FakeTable
+from system_registry import bump_access_map_version
+
+ADMIN_USER_ID = "04484418-1051-70ea-d0d3-afb45eadb6e7"
+NOW = 1700000000
+
+
+class FrozenClock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FrozenClock(NOW)
+    monkeypatch.setattr(notify_user, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def table(monkeypatch, tmp_path, clock):
+    table = FakeTable(indexes={'user-system-index': ('GSI1PK', 'GSI1SK')})
+    monkeypatch.setattr(notify_user, 'table', table)
+    monkeypatch.setattr(notify_user, 'ACCESS_MAP_SNAPSHOT_PATH', str(tmp_path / 'access_map.json'))
+    new_container(monkeypatch)
+    return table
+
+
+def new_container(monkeypatch):
+    """Start from an empty in-memory map, as a fresh Lambda container would"""
+    monkeypatch.setattr(notify_user, 'access_map', {
+        'loaded': False,
+        'version': None,
+        'checkedAt': 0.0,
+        'systems': {}
+    })
+
+
+def link(table, user_id, system_id):
+    table.seed({
+        'PK': f'User#{user_id}',
+        'SK': f'System#{system_id}',
+        'userId': user_id,
+        'GSI1PK': f'System#{system_id}',
+        'GSI1SK': f'User#{user_id}'
+    })
+
+
+def link_queries(table):
+    return sum(1 for call in table.calls if call == ('query', 'user-system-index'))
+
+
+def test_repeated_lookups_are_served_from_the_cache(table):
+    link(table, 'u1', 's1')
+
+    assert notify_user.get_users_with_system_access('s1') == [ADMIN_USER_ID, 'u1']
+    assert notify_user.get_users_with_system_access('s1') == [ADMIN_USER_ID, 'u1']
+
+    assert link_queries(table) == 1
+
+
+def test_entries_expire_after_the_ttl(table, clock):
+    link(table, 'u1', 's1')
+    notify_user.get_users_with_system_access('s1')
+
+    link(table, 'u2', 's1')
+    clock.now += notify_user.ACCESS_MAP_TTL_SECONDS + 1
+
+    assert notify_user.get_users_with_system_access('s1') == [ADMIN_USER_ID, 'u1', 'u2']
+    assert link_queries(table) == 2
+
+
+def test_version_bump_invalidates_after_the_next_version_check(table, clock):
+    link(table, 'u1', 's1')
+    notify_user.get_users_with_system_access('s1')
+
+    link(table, 'u2', 's1')
+    bump_access_map_version(table)
+
+    # The version stamp is only re-read every ACCESS_MAP_VERSION_CHECK_SECONDS
+    assert notify_user.get_users_with_system_access('s1') == [ADMIN_USER_ID, 'u1']
+
+    clock.now += notify_user.ACCESS_MAP_VERSION_CHECK_SECONDS
+    assert notify_user.get_users_with_system_access('s1') == [ADMIN_USER_ID, 'u1', 'u2']
+    assert link_queries(table) == 2
+
+
+def test_new_container_starts_from_the_tmp_snapshot(table, monkeypatch):
+    link(table, 'u1', 's1')
+    notify_user.get_users_with_system_access('s1')
+
+    new_container(monkeypatch)
+    assert notify_user.get_users_with_system_access('s1') == [ADMIN_USER_ID, 'u1']
+    assert link_queries(table) == 1
+
+    # A snapshot from before a version bump is thrown away
+    bump_access_map_version(table)
+    new_container(monkeypatch)
+    notify_user.get_users_with_system_access('s1')
+    assert link_queries(table) == 2
+
+
+def test_query_failure_falls_back_to_admin_only(table, monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError('throttled')
+
+    monkeypatch.setattr(table, 'query', fail)
+
+    assert notify_user.get_users_with_system_access('s1') == [ADMIN_USER_ID]
@@ -0,0 +1,200 @@
+"""
+Escalation sweep tests (notify_technician.sweep_due_incidents) against a stubbed table.
+
+Run from the backend directory: python -m pytest tests
+"""
+
+import pytest
+
+import notify_technician
+from escalation_queue import get_escalation_bucket
+from fake_dynamodb import FakeResource, FakeTable
+
+# 2023-11-14T22:13:30Z, 30 seconds into a one-minute bucket
+NOW = 1700000010
+BUCKET = 60
+CURRENT_BUCKET = NOW - NOW % BUCKET
+
+
+def incident(incident_id, due_at, **fields):
+    return {
+        'PK': f'Incident#{incident_id}',
+        'SK': 'User#user-1',
+        'userId': 'user-1',
+        'systemId': 'system-1',
+        'deviceId': f'device-{incident_id}',
+        'status': 'pending',
+        'newStatus': 'red',
+        'expiresAt': due_at + 3600,
+        'GSI4PK': get_escalation_bucket(due_at),
+        'GSI4SK': due_at,
+        **fields
+    }
+
+
+class FrozenClock:
+    """Replaces the module's time so claims are stamped at the sweep's now"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FrozenClock(NOW)
+    monkeypatch.setattr(notify_technician, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def table(monkeypatch, clock):
+    table = FakeTable(indexes={notify_technician.ESCALATION_INDEX_NAME: ('GSI4PK', 'GSI4SK')})
+    table.seed(
+        {'PK': 'User#user-1', 'SK': 'PROFILE', 'technician_email': 'tech@example.com'},
+        {'PK': 'System#system-1', 'SK': 'PROFILE', 'name': 'Main Street'}
+    )
+    monkeypatch.setattr(notify_technician, 'table', table)
+    monkeypatch.setattr(notify_technician, 'dynamodb', FakeResource(table))
+    monkeypatch.setattr(notify_technician, 'ESCALATION_BUCKET_MINUTES', 1)
+    return table
+
+
+class EmailOutbox(list):
+    """Records technician emails; set ok = False to make SES fail"""
+    ok = True
+
+
+@pytest.fixture
+def emails(monkeypatch):
+    outbox = EmailOutbox()
+
+    def send(email, subject, body):
+        outbox.append((email, subject))
+        return outbox.ok
+
+    monkeypatch.setattr(notify_technician, 'send_technician_email', send)
+    return outbox
+
+
+def cursor(table):
+    return int(table.item(*notify_technician.SWEEP_CURSOR_KEY.values())['bucketStart'])
+
+
+def save_cursor(table, bucket_start):
+    table.seed({**notify_technician.SWEEP_CURSOR_KEY, 'bucketStart': bucket_start})
+
+
+def test_sweeps_due_buckets_from_cursor_and_advances_it(table, emails):
+    save_cursor(table, CURRENT_BUCKET - 3 * BUCKET)
+    table.seed(
+        incident('due', CURRENT_BUCKET - 2 * BUCKET + 5),
+        incident('later-this-bucket', NOW + 20),
+        incident('before-cursor', CURRENT_BUCKET - 10 * BUCKET)
+    )
+
+    summary = notify_technician.sweep_due_incidents(now=NOW)
+
+    assert summary['buckets_swept'] == 4
+    assert summary['incidents_due'] == 1
+    assert summary['incidents_processed'] == 1
+    assert emails == [('tech@example.com', emails[0][1])]
+
+    processed = table.item('Incident#due', 'User#user-1')
+    assert processed['status'] == 'processed'
+    assert 'GSI4PK' not in processed
+    assert table.item('Incident#later-this-bucket', 'User#user-1')['status'] == 'pending'
+    assert table.item('Incident#before-cursor', 'User#user-1')['status'] == 'pending'
+
+    # Everything due has been handled, so the next sweep starts at the current bucket
+    assert cursor(table) == CURRENT_BUCKET
+
+
+def test_without_cursor_only_looks_back_the_initial_window(table, emails, monkeypatch):
+    monkeypatch.setattr(notify_technician, 'SWEEP_INITIAL_LOOKBACK_MINUTES', 2)
+    table.seed(
+        incident('recent', CURRENT_BUCKET - BUCKET),
+        incident('old', CURRENT_BUCKET - 30 * BUCKET)
+    )
+
+    summary = notify_technician.sweep_due_incidents(now=NOW)
+
+    assert summary['buckets_swept'] == 3
+    assert summary['incidents_processed'] == 1
+    assert table.item('Incident#old', 'User#user-1')['status'] == 'pending'
+    assert cursor(table) == CURRENT_BUCKET
+
+
+def test_incident_claimed_by_another_sweep_is_skipped_and_holds_cursor(table, emails):
+    claimed_bucket = CURRENT_BUCKET - 2 * BUCKET
+    save_cursor(table, CURRENT_BUCKET - 3 * BUCKET)
+    table.seed(
+        incident('claimed', claimed_bucket + 1, escalationClaimedAt=NOW - 10),
+        incident('free', CURRENT_BUCKET - BUCKET)
+    )
+
+    summary = notify_technician.sweep_due_incidents(now=NOW)
+
+    assert summary['incidents_due'] == 2
+    assert summary['incidents_skipped'] == 1
+    assert summary['incidents_processed'] == 1
+    assert len(emails) == 1
+    assert table.item('Incident#claimed', 'User#user-1')['status'] == 'pending'
+    assert cursor(table) == claimed_bucket
+
+
+def test_stale_claim_is_taken_over(table, emails):
+    save_cursor(table, CURRENT_BUCKET - BUCKET)
+    table.seed(incident('abandoned', CURRENT_BUCKET - BUCKET,
+                        escalationClaimedAt=NOW - notify_technician.ESCALATION_CLAIM_SECONDS - 1))
+
+    summary = notify_technician.sweep_due_incidents(now=NOW)
+
+    assert summary['incidents_processed'] == 1
+    assert table.item('Incident#abandoned', 'User#user-1')['status'] == 'processed'
+
+
+def test_failing_incident_is_retried_then_dead_lettered(table, emails, clock, monkeypatch):
+    monkeypatch.setattr(notify_technician, 'ESCALATION_MAX_ATTEMPTS', 2)
+    emails.ok = False
+    failing_bucket = CURRENT_BUCKET - 2 * BUCKET
+    save_cursor(table, failing_bucket)
+    table.seed(incident('failing', failing_bucket))
+
+    first = notify_technician.sweep_due_incidents(now=clock.now)
+
+    item = table.item('Incident#failing', 'User#user-1')
+    assert first['errors'] == 1 and first['incidents_dead_lettered'] == 0
+    assert item['status'] == 'pending'
+    assert item['escalationAttempts'] == 1
+    assert 'escalationClaimedAt' not in item
+    assert item['GSI4PK'] == get_escalation_bucket(failing_bucket)
+    assert cursor(table) == failing_bucket
+
+    clock.now = NOW + BUCKET
+    second = notify_technician.sweep_due_incidents(now=clock.now)
+
+    item = table.item('Incident#failing', 'User#user-1')
+    assert second['incidents_dead_lettered'] == 1
+    assert 'GSI4PK' not in item and 'escalationFailedAt' in item
+    assert cursor(table) == CURRENT_BUCKET + BUCKET
+    assert len(emails) == 2
+
+
+def test_recovered_device_is_dismissed_without_email(table, emails):
+    save_cursor(table, CURRENT_BUCKET - BUCKET)
+    table.seed(
+        incident('recovered', CURRENT_BUCKET - BUCKET),
+        {'PK': 'Inverter#device-recovered', 'SK': 'STATUS', 'status': 'green'}
+    )
+
+    summary = notify_technician.sweep_due_incidents(now=NOW)
+
+    assert summary['incidents_processed'] == 1
+    assert emails == []
+    assert table.item('Incident#recovered', 'User#user-1')['status'] == 'dismissed'
@@ -0,0 +1,136 @@
+"""
+Intent router and tool dispatch tests (chat_service_lambda).
+
+No OpenAI, Pinecone or Solar.web access: the embedding classifier is given
+embeddings that fail, and tools are replaced by stubs.
+
+Run from the backend directory: python -m pytest tests
+"""
+
+import asyncio
+from datetime import date
+
+import pytest
+
+import chat_service_lambda as chat
+
+TODAY = date(2024, 6, 12)  # a Wednesday
+
+
+class UnavailableEmbeddings:
+    def embed_documents(self, texts):
+        raise RuntimeError('no embeddings in tests')
+
+    def embed_query(self, text):
+        raise RuntimeError('no embeddings in tests')
+
+
+def route(query, system_id='system-1'):
+    return asyncio.run(chat.IntentRouter(UnavailableEmbeddings()).route(query, system_id))
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('how much energy today', ('2024-06-12', '2024-06-12', 'today')),
+    ('production yesterday', ('2024-06-11', '2024-06-11', 'yesterday')),
+    ('energy over the last 7 days', ('2024-06-06', '2024-06-12', 'last_7_days')),
+    ('energy this week', ('2024-06-10', '2024-06-12', 'this_week')),
+    ('energy last week', ('2024-06-03', '2024-06-09', 'last_week')),
+    ('energy last month', ('2024-05-01', '2024-05-31', 'last_month')),
+    ('energy this year', ('2024-01', '2024-06', '2024_monthly')),
+    ('energy in may', ('2024-05-01', '2024-05-31', 'May_2024')),
+    ('energy in september', ('2023-09-01', '2023-09-30', 'September_2023')),
+    ('energy for march 2022', ('2022-03-01', '2022-03-31', 'March_2022')),
+    ('energy in 2023', ('2023-01', '2023-12', '2023_monthly')),
+])
+def test_parse_period(query, expected):
+    assert chat.parse_period(query, today=TODAY) == expected
+
+
+def test_parse_period_ignores_future_and_missing_periods():
+    assert chat.parse_period('energy in july 2030', today=TODAY) is None
+    assert chat.parse_period('how much energy did I make', today=TODAY) is None
+
+
+@pytest.mark.parametrize('query, periods', [
+    ('energy this month', 1),
+    ('energy in 2023 compared to 2022', 2),
+    ('energy this month vs last month', 2),
+    ('energy in march and april', 2),
+    ('may I see my energy for june', 1),
+    ('energy in may and june', 2),
+])
+def test_count_periods(query, periods):
+    assert chat.count_periods(query) == periods
+
+
+@pytest.mark.parametrize('query', [
+    'How much energy did I produce in 2023 compared to 2022?',
+    'Energy production this month vs last month',
+    'Was my output last week higher than this week?',
+    'How much energy did I make in March and April?',
+    'What is the difference in CO2 savings between this year and last year?',
+])
+def test_period_comparisons_are_left_to_the_model(query):
+    assert route(query) is None
+
+
+def test_single_period_question_is_routed():
+    calls = route('How much energy did my system produce yesterday?')
+
+    [(function_name, args)] = calls
+    assert function_name == 'get_energy_production'
+    assert args['system_id'] == 'system-1'
+    assert args['start_date'] == args['end_date']
+
+
+def test_chart_question_adds_chart_call_for_the_same_period():
+    calls = route('Show me a chart of my CO2 savings last month')
+
+    assert [function_name for function_name, _ in calls] == ['get_co2_savings', 'generate_chart_data']
+    data_args, chart_args = calls[0][1], calls[1][1]
+    assert chart_args['data_type'] == 'co2_savings'
+    assert (chart_args['start_date'], chart_args['end_date']) == (data_args['start_date'], data_args['end_date'])
+
+
+@pytest.mark.parametrize('query, system_id', [
+    ('and what about yesterday?', 'system-1'),
+    ('How much energy did I produce yesterday?', None),
+    ('Are my inverters and my site online?', 'system-1'),
+])
+def test_ambiguous_or_incomplete_questions_are_left_to_the_model(query, system_id):
+    assert route(query, system_id) is None
+
+
+def test_status_and_knowledge_routes():
+    assert route('Are my inverters online?') == [
+        ('get_inverter_information', {'system_id': 'system-1', 'data_type': 'status'})
+    ]
+    assert route('How do I reset my inverter?', None) == [
+        ('search_vector_db', {'query': 'How do I reset my inverter?'})
+    ]
+
+
+def test_chart_reuses_the_data_fetch_of_the_same_turn(monkeypatch):
+    fetches = []
+
+    async def fake_call_tool(function_name, function_args):
+        if function_name == 'generate_chart_data':
+            return {'chart_from': function_args.get('raw_data')}
+        fetches.append(function_name)
+        await asyncio.sleep(0)
+        return {'data': f"{function_name}:{function_args['start_date']}"}
+
+    monkeypatch.setattr(chat, 'call_tool', fake_call_tool)
+    period = {'system_id': 'system-1', 'start_date': '2024-05-01', 'end_date': '2024-05-31'}
+
+    results = asyncio.run(chat.call_tools([
+        ('get_energy_production', dict(period)),
+        ('generate_chart_data', {**period, 'data_type': 'energy_production', 'time_period': 'May_2024'}),
+        ('get_energy_production', {**period, 'start_date': '2024-04-01'})
+    ]))
+
+    assert sorted(fetches) == ['get_energy_production', 'get_energy_production']
+    assert results[0] == {'data': 'get_energy_production:2024-05-01'}
+    assert results[1] == {'chart_from': results[0]}
+    assert results[2] == {'data': 'get_energy_production:2024-04-01'}
+
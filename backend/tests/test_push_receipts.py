@@ -0,0 +1,177 @@
+"""
+Expo push delivery and receipt tests (expo_push) with a stubbed Expo API and table.
+
+Run from the backend directory: python -m pytest tests
+"""
+
+import gzip
+import json
+
+import pytest
+
+import expo_push
+from fake_dynamodb import FakeTable
+
+NOW = 1700000000
+
+
+class FrozenClock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeExpo:
+    """Answers push sends with one ticket per token (ticket_id(token)) and receipts from self.receipts"""
+
+    def __init__(self):
+        self.rejected = set()
+        self.receipts = {}
+        self.sends = []
+        self.receipt_requests = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        if (headers or {}).get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        payload = json.loads(data)
+
+        if url == expo_push.EXPO_PUSH_URL:
+            self.sends.append(payload)
+            tickets = []
+            for message in payload:
+                if message['to'] in self.rejected:
+                    tickets.append({'status': 'error', 'message': 'gone', 'details': {'error': 'DeviceNotRegistered'}})
+                else:
+                    tickets.append({'status': 'ok', 'id': ticket_id(message['to'])})
+            return FakeResponse({'data': tickets})
+
+        self.receipt_requests.append(payload['ids'])
+        return FakeResponse({'data': {receipt_id: self.receipts[receipt_id]
+                                      for receipt_id in payload['ids'] if receipt_id in self.receipts}})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FrozenClock(NOW)
+    monkeypatch.setattr(expo_push, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def expo(monkeypatch):
+    expo = FakeExpo()
+    monkeypatch.setattr(expo_push, 'session', expo)
+    return expo
+
+
+@pytest.fixture
+def table():
+    return FakeTable()
+
+
+def token(name):
+    return f'ExponentPushToken[{name}]'
+
+
+def ticket_id(push_token):
+    return f'ticket-{push_token}'
+
+
+def seed_devices(table, holders):
+    """holders: token name -> [(user, device), ...]; returns the token -> [Device# key] map"""
+    device_keys = {}
+    for name, devices in holders.items():
+        for user, device in devices:
+            key = {'PK': f'User#{user}', 'SK': f'Device#{device}'}
+            table.seed({**key, 'pushToken': token(name)})
+            device_keys.setdefault(token(name), []).append(key)
+    return device_keys
+
+
+def pending_items(table):
+    return [item for (pk, _), item in table.items.items() if pk == expo_push.PENDING_RECEIPTS_PK]
+
+
+def test_sends_in_chunks_and_stores_tickets_for_later(table, expo, clock):
+    tokens = [token(i) for i in range(150)]
+
+    assert expo_push.send_expo_notifications(tokens + [tokens[0], 'not-a-token'], 'Title', 'Body', {},
+                                             table=table, device_keys={tokens[0]: []})
+
+    assert sorted(len(chunk) for chunk in expo.sends) == [50, 100]
+    assert expo.receipt_requests == []
+    [pending] = pending_items(table)
+    assert len(pending['tickets']) == 150
+    assert pending['SK'].startswith(f'Pending#{NOW:010d}#')
+
+
+def test_ticket_rejection_prunes_every_holder_right_away(table, expo, clock):
+    device_keys = seed_devices(table, {'gone': [('u1', 'd1'), ('u2', 'd2')], 'ok': [('u1', 'd3')]})
+    expo.rejected.add(token('gone'))
+
+    expo_push.send_expo_notifications([token('gone'), token('ok')], 'Title', 'Body', {},
+                                      table=table, device_keys=device_keys)
+
+    assert 'pushToken' not in table.item('User#u1', 'Device#d1')
+    assert 'pushToken' not in table.item('User#u2', 'Device#d2')
+    assert table.item('User#u1', 'Device#d3')['pushToken'] == token('ok')
+
+
+def test_receipts_are_checked_after_the_delay_and_prune_every_holder(table, expo, clock):
+    device_keys = seed_devices(table, {'gone': [('u1', 'd1'), ('u2', 'd2')], 'ok': [('u1', 'd3')]})
+    expo_push.send_expo_notifications([token('gone'), token('ok')], 'Title', 'Body', {},
+                                      table=table, device_keys=device_keys)
+    expo.receipts = {
+        ticket_id(token('gone')): {'status': 'error', 'message': 'gone', 'details': {'error': 'DeviceNotRegistered'}},
+        ticket_id(token('ok')): {'status': 'ok'}
+    }
+
+    # Too early: nothing is due yet
+    assert expo_push.check_pending_receipts(table) == 0
+    assert expo.receipt_requests == []
+
+    clock.now += expo_push.RECEIPT_DELAY_SECONDS + 1
+    assert expo_push.check_pending_receipts(table) == 2
+
+    assert 'pushToken' not in table.item('User#u1', 'Device#d1')
+    assert 'pushToken' not in table.item('User#u2', 'Device#d2')
+    assert table.item('User#u1', 'Device#d3')['pushToken'] == token('ok')
+    assert pending_items(table) == []
+
+
+def test_unready_receipts_are_kept_until_expo_drops_them(table, expo, clock):
+    device_keys = seed_devices(table, {'a': [('u1', 'd1')]})
+    expo_push.send_expo_notifications([token('a')], 'Title', 'Body', {}, table=table, device_keys=device_keys)
+
+    clock.now += expo_push.RECEIPT_DELAY_SECONDS + 1
+    expo_push.check_pending_receipts(table)
+    assert len(pending_items(table)) == 1
+
+    clock.now = NOW + expo_push.RECEIPT_MAX_AGE_SECONDS + 1
+    expo_push.check_pending_receipts(table)
+    assert pending_items(table) == []
+
+
+def test_reregistered_device_keeps_its_new_token(table, expo, clock):
+    device_keys = seed_devices(table, {'old': [('u1', 'd1')]})
+    expo_push.send_expo_notifications([token('old')], 'Title', 'Body', {}, table=table, device_keys=device_keys)
+    table.seed({'PK': 'User#u1', 'SK': 'Device#d1', 'pushToken': token('new')})
+    expo.receipts = {ticket_id(token('old')): {'status': 'error', 'details': {'error': 'DeviceNotRegistered'}}}
+
+    clock.now += expo_push.RECEIPT_DELAY_SECONDS + 1
+    assert expo_push.check_pending_receipts(table) == 0
+
+    assert table.item('User#u1', 'Device#d1')['pushToken'] == token('new')
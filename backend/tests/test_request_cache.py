@@ -0,0 +1,74 @@
+"""
+Per-request DynamoDB read cache tests (chat_service_lambda.RequestCache) against a stubbed table.
+
+Run from the backend directory: python -m pytest tests
+"""
+
+import pytest
+
+import chat_service_lambda as chat
+from fake_dynamodb import FakeResource, FakeTable
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable(indexes={'system-inverter-index': ('GSI2PK', 'GSI2SK')})
+    monkeypatch.setattr(chat, 'table', table)
+    monkeypatch.setattr(chat, 'dynamodb', FakeResource(table))
+    table.seed(
+        {'PK': 'User#u1', 'SK': 'PROFILE', 'role': 'user'},
+        {'PK': 'User#u1', 'SK': 'System#s1'},
+        {'PK': 'System#s1', 'SK': 'Inverter#a', 'GSI2PK': 'System#s1', 'GSI2SK': 'Inverter#a'},
+        {'PK': 'System#s1', 'SK': 'Inverter#b', 'GSI2PK': 'System#s1', 'GSI2SK': 'Inverter#b'},
+        {'PK': 'Inverter#a', 'SK': 'STATUS', 'device_id': 'a', 'status': 'green'},
+        {'PK': 'Inverter#b', 'SK': 'STATUS', 'device_id': 'b', 'status': 'red'}
+    )
+    return table
+
+
+def reads(table, operation):
+    return [arg for call, arg in table.calls if call == operation]
+
+
+def test_identical_reads_hit_the_table_once(table):
+    cache = chat.RequestCache(table)
+    key = {'PK': 'User#u1', 'SK': 'PROFILE'}
+
+    first = cache.get_item(Key=key)
+    first['Item']['role'] = 'admin'
+
+    assert cache.get_item(Key=key)['Item']['role'] == 'user'
+    assert reads(table, 'get_item') == [key]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_batch_get_only_fetches_keys_not_read_yet(table, monkeypatch):
+    cache = chat.RequestCache(table)
+    cache.get_item(Key={'PK': 'Inverter#a', 'SK': 'STATUS'})
+
+    batches = []
+    fetch = chat.batch_get_items
+    monkeypatch.setattr(chat, 'batch_get_items', lambda keys: batches.append(keys) or fetch(keys))
+    keys = [{'PK': f'Inverter#{device}', 'SK': 'STATUS'} for device in ('a', 'b', 'missing')]
+
+    items = cache.batch_get_items(keys)
+    assert sorted(items) == [('Inverter#a', 'STATUS'), ('Inverter#b', 'STATUS')]
+    assert batches == [keys[1:]]
+
+    # A missing item is remembered as missing, and batch results serve get_item
+    assert cache.batch_get_items(keys) == items
+    assert cache.get_item(Key={'PK': 'Inverter#b', 'SK': 'STATUS'})['Item']['status'] == 'red'
+    assert len(batches) == 1
+
+
+def test_tool_calls_of_one_turn_share_the_access_check(table):
+    cache = chat.RequestCache(table)
+
+    for data_type in ('status', 'status', 'details'):
+        result = chat.get_inverter_information('u1', 's1', data_type, request_cache=cache)
+        assert 'error' not in result
+
+    assert reads(table, 'get_item').count({'PK': 'User#u1', 'SK': 'PROFILE'}) == 1
+    assert reads(table, 'get_item').count({'PK': 'User#u1', 'SK': 'System#s1'}) == 1
+    assert len(reads(table, 'query')) == 1
+    assert cache.stats()['misses'] == 3 + 2 + 2
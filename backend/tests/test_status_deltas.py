@@ -0,0 +1,146 @@
+"""
+System status delta tests (update_status.apply_status_deltas) against a stubbed table.
+
+Run from the backend directory: python -m pytest tests
+"""
+
+import pytest
+
+import update_status
+from fake_dynamodb import FakeTable
+
+SYSTEM_KEY = ('System#system-1', 'STATUS')
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(update_status, 'table', table)
+    return table
+
+
+def seed_status(table, green=(), red=(), moon=(), status='green'):
+    item = {
+        'PK': SYSTEM_KEY[0],
+        'SK': SYSTEM_KEY[1],
+        'pvSystemId': 'system-1',
+        'status': status,
+        'TotalInverters': len(green) + len(red) + len(moon),
+        'statusVersion': 1
+    }
+    for attribute, inverters in (('GreenInverters', green), ('RedInverters', red), ('MoonInverters', moon)):
+        if inverters:
+            item[attribute] = set(inverters)
+    table.seed(item)
+
+
+def change(device_id, previous_status, new_status, timestamp=None):
+    return {
+        'deviceId': device_id,
+        'pvSystemId': 'system-1',
+        'previousStatus': previous_status,
+        'newStatus': new_status,
+        'timestamp': timestamp
+    }
+
+
+def status_item(table):
+    return table.item(*SYSTEM_KEY)
+
+
+def test_delta_moves_inverter_and_recomputes_status(table):
+    seed_status(table, green={'a', 'b'})
+
+    assert update_status.apply_status_deltas('system-1', [change('a', 'green', 'red')])
+
+    item = status_item(table)
+    assert item['GreenInverters'] == {'b'}
+    assert item['RedInverters'] == {'a'}
+    assert item['status'] == 'red'
+    assert item['TotalInverters'] == 2
+    assert item['statusVersion'] == 2
+
+
+def test_new_inverter_is_added_to_its_set(table):
+    seed_status(table, green={'a'})
+
+    update_status.apply_status_deltas('system-1', [change('new', 'Moon', 'Moon')])
+
+    item = status_item(table)
+    assert item['MoonInverters'] == {'new'}
+    assert item['TotalInverters'] == 2
+    assert item['status'] == 'green'
+
+
+def test_stale_delta_does_not_move_inverter(table):
+    # c already went green -> red; a late green -> Moon message must not pull it out of red
+    seed_status(table, green={'a'}, red={'c'}, status='red')
+
+    assert update_status.apply_status_deltas('system-1', [change('c', 'green', 'Moon')])
+
+    item = status_item(table)
+    assert item['RedInverters'] == {'c'}
+    assert 'MoonInverters' not in item
+    assert item['status'] == 'red'
+    assert item['statusVersion'] == 1
+
+
+def test_only_stale_devices_of_a_batch_are_skipped(table):
+    seed_status(table, green={'a', 'b'}, red={'c'}, status='red')
+
+    update_status.apply_status_deltas('system-1', [
+        change('a', 'green', 'Moon'),
+        change('c', 'green', 'Moon'),
+        change('c', 'red', 'green')
+    ])
+
+    item = status_item(table)
+    # c's first change in the batch is stale, so its previousStatus (green) no longer matches
+    assert item['MoonInverters'] == {'a'}
+    assert item['GreenInverters'] == {'b'}
+    assert item['RedInverters'] == {'c'}
+
+
+def test_newest_change_per_device_wins(table):
+    seed_status(table, green={'a'})
+
+    update_status.apply_status_deltas('system-1', [
+        change('a', 'red', 'green', timestamp='2024-01-01T00:02:00'),
+        change('a', 'green', 'red', timestamp='2024-01-01T00:01:00')
+    ])
+
+    item = status_item(table)
+    assert item['GreenInverters'] == {'a'}
+    assert 'RedInverters' not in item
+
+
+def test_missing_status_item_falls_back_to_rebuild(table):
+    table.seed(
+        {'PK': 'Inverter#a', 'SK': 'STATUS', 'pvSystemId': 'system-1', 'device_id': 'a', 'status': 'red'},
+        {'PK': 'Inverter#b', 'SK': 'STATUS', 'pvSystemId': 'system-1', 'device_id': 'b', 'status': 'green'},
+        {'PK': 'Inverter#x', 'SK': 'STATUS', 'pvSystemId': 'system-2', 'device_id': 'x', 'status': 'red'}
+    )
+
+    assert update_status.process_system_status_changes('system-1', [change('a', 'green', 'red')])
+
+    item = status_item(table)
+    assert item['RedInverters'] == {'a'}
+    assert item['GreenInverters'] == {'b'}
+    assert item['status'] == 'red'
+
+
+def test_sqs_batch_is_coalesced_per_system(table, monkeypatch):
+    applied = []
+    monkeypatch.setattr(update_status, 'process_system_status_changes',
+                        lambda system_id, changes: applied.append((system_id, len(changes))) or True)
+    records = [
+        {'eventSource': 'aws:sqs', 'messageId': f'm{i}',
+         'body': '{"deviceId": "d%d", "pvSystemId": "%s", "previousStatus": "green", "newStatus": "red"}'
+                 % (i, 'system-1' if i < 3 else 'system-2')}
+        for i in range(4)
+    ]
+
+    response = update_status.lambda_handler({'Records': records}, None)
+
+    assert sorted(applied) == [('system-1', 3), ('system-2', 1)]
+    assert response['batchItemFailures'] == []
@@ -5,11 +5,14 @@ This Lambda function subscribes to SNS notifications from device status polling
 and updates the system status in DynamoDB based on individual device changes.
 
 Key Features:
-- Triggered by SNS messages from device_status_polling.py
+- Triggered by SNS messages from device_status_polling.py (directly or via an SQS subscription)
+- Coalesces records per system so each system is updated once per batch
 - Updates system status records in DynamoDB
 - Categorizes inverters by status (green, red, moon)
 - Determines overall system status based on inverter statuses
-- Only updates if there are actual changes to minimize DynamoDB writes
+- Applies each change as an atomic string set ADD/DELETE delta on the System STATUS item,
+  conditional on the inverter still being in its previousStatus set (stale deltas are skipped)
+- Full rebuild from inverter STATUS items only runs in reconcile_handler (periodic job)
 
 Logic:
 - If ANY red inverters: system status = "red"
@@ -18,8 +21,11 @@ Logic:
 
 Usage:
 - Deploy as AWS Lambda function
-- Configure SNS trigger with the same topic as device_status_polling.py
+- Configure SNS trigger with the same topic as device_status_polling.py, or subscribe an
+  SQS queue to the topic and use it as the trigger with BatchSize of 100,
+  a MaximumBatchingWindowInSeconds of a few seconds and ReportBatchItemFailures enabled
 - Set environment variables for DynamoDB access
+- Schedule reconcile_handler periodically (or run this file) to repair drift
 """
 
 import os
@@ -27,9 +33,10 @@ import json
 import logging
 import boto3
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from decimal import Decimal
 import botocore.config
+from botocore.exceptions import ClientError
 
 # Set up logging
 logging.basicConfig(
@@ -49,6 +56,24 @@ dynamodb_config = botocore.config.Config(
 dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION, config=dynamodb_config)
 table = dynamodb.Table(DYNAMODB_TABLE_NAME)
 
+# System STATUS attribute holding the inverters in each status
+STATUS_ATTRIBUTES = {
+    'green': 'GreenInverters',
+    'red': 'RedInverters',
+    'Moon': 'MoonInverters',
+    'moon': 'MoonInverters'
+}
+
+# Expression attribute names of the inverter sets in delta updates
+SET_ALIASES = {
+    'GreenInverters': '#green',
+    'RedInverters': '#red',
+    'MoonInverters': '#moon'
+}
+
+# Inverters per conditional delta update; keeps the condition under DynamoDB's 4 KB expression limit
+DELTA_CHUNK_SIZE = 20
+
 def get_inverter_statuses(system_id: str) -> Dict[str, List[str]]:
     """Get current status of all inverters for a system, categorized by status"""
     try:
@@ -171,7 +196,7 @@ def get_current_system_status(system_id: str) -> Dict[str, Any]:
         }
 
 def update_system_status(system_id: str, green_inverters: List[str], red_inverters: List[str], moon_inverters: List[str]) -> bool:
-    """Update system status in DynamoDB"""
+    """Rewrite the full system status record in DynamoDB (used for reconciliation)"""
     try:
         # Determine overall system status
         overall_status = determine_system_status(green_inverters, red_inverters, moon_inverters)
@@ -190,11 +215,13 @@ def update_system_status(system_id: str, green_inverters: List[str], red_inverte
         new_red = set(red_inverters)
         new_moon = set(moon_inverters)
         
-        # Check if there are any changes
+        # Check if there are any changes (legacy records storing lists are always rewritten as sets)
         if (current_green == new_green and 
             current_red == new_red and 
             current_moon == new_moon and 
-            current_overall == overall_status):
+            current_overall == overall_status and
+            not any(isinstance(current_status_record.get(attribute), list)
+                    for attribute in ('GreenInverters', 'RedInverters', 'MoonInverters'))):
             
             logger.info(f"No changes detected for system {system_id}, skipping update")
             return True
@@ -208,13 +235,17 @@ def update_system_status(system_id: str, green_inverters: List[str], red_inverte
             'SK': 'STATUS',
             'pvSystemId': system_id,
             'status': overall_status,
-            'GreenInverters': green_inverters,
-            'RedInverters': red_inverters,
-            'MoonInverters': moon_inverters,
             'TotalInverters': total_inverters,
+            'statusVersion': int(current_status_record.get('statusVersion', 0) or 0) + 1,
             'lastUpdated': current_time
         }
         
+        # Inverter lists are stored as string sets so deltas can ADD/DELETE them atomically.
+        # DynamoDB does not allow empty sets, so empty categories are omitted.
+        for attribute, inverters in (('GreenInverters', new_green), ('RedInverters', new_red), ('MoonInverters', new_moon)):
+            if inverters:
+                status_record[attribute] = inverters
+        
         # Update DynamoDB
         table.put_item(Item=status_record)
         
@@ -229,81 +260,270 @@ def update_system_status(system_id: str, green_inverters: List[str], red_inverte
         logger.error(f"Error updating system status for {system_id}: {str(e)}")
         return False
 
+def get_status_attribute(status: str) -> str:
+    """Map a device status to the system status attribute holding it (unknown statuses count as Moon)"""
+    return STATUS_ATTRIBUTES.get(status, 'MoonInverters')
+
+def rebuild_system_status(system_id: str) -> bool:
+    """Recompute the system status from every inverter STATUS item and rewrite it"""
+    inverter_statuses = get_inverter_statuses(system_id)
+    
+    return update_system_status(
+        system_id,
+        inverter_statuses['green'],
+        inverter_statuses['red'],
+        inverter_statuses['moon']
+    )
+
+def get_latest_changes_per_device(changes: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Collapse a system's changes to one per device: the newest newStatus with the
+    previousStatus of the device's first change in the batch"""
+    latest: Dict[str, Dict[str, Any]] = {}
+    
+    # Stable sort keeps arrival order for messages without (or with equal) timestamps
+    for change in sorted(changes, key=lambda c: c.get('timestamp') or ''):
+        first = latest.get(change['deviceId'], change)
+        latest[change['deviceId']] = {**change, 'previousStatus': first['previousStatus']}
+    
+    return latest
+
+def update_status_sets(system_id: str, target_attribute: str, devices: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Move devices into target_attribute and out of the other two sets in one update
+    
+    Conditional on every device still being in the set for its previousStatus, or in
+    none of the sets yet. Returns the updated item; raises ClientError
+    (ConditionalCheckFailedException) when the condition fails.
+    """
+    values = {':one': 1, ':now': datetime.utcnow().isoformat(), ':devices': set(devices)}
+    conditions = ['attribute_exists(PK)']
+    for i, (device_id, change) in enumerate(devices.items()):
+        values[f':i{i}'] = device_id
+        previous_alias = SET_ALIASES[get_status_attribute(change['previousStatus'])]
+        in_any_set = ' OR '.join(f'contains({alias}, :i{i})' for alias in SET_ALIASES.values())
+        conditions.append(f'(contains({previous_alias}, :i{i}) OR NOT ({in_any_set}))')
+    
+    other_aliases = [alias for attribute, alias in SET_ALIASES.items() if attribute != target_attribute]
+    response = table.update_item(
+        Key={'PK': f'System#{system_id}', 'SK': 'STATUS'},
+        UpdateExpression=(f'SET lastUpdated = :now ADD statusVersion :one, {SET_ALIASES[target_attribute]} :devices '
+                          'DELETE ' + ', '.join(f'{alias} :devices' for alias in other_aliases)),
+        ConditionExpression=' AND '.join(conditions),
+        ExpressionAttributeNames={alias: attribute for attribute, alias in SET_ALIASES.items()},
+        ExpressionAttributeValues=values,
+        ReturnValues='ALL_NEW'
+    )
+    return response.get('Attributes', {})
+
+def apply_status_deltas(system_id: str, changes: List[Dict[str, Any]]) -> bool:
+    """Apply device status changes to the system STATUS item as string set ADD/DELETE deltas
+    
+    Each device is added to the set for its new status and deleted from the other two,
+    so the update is O(1) in the number of inverters and safe to replay. Devices moving
+    to the same set share one update, conditional on each of them still being in the
+    set for its previousStatus. If that fails, the devices are applied one by one and
+    a stale or out-of-order change (the inverter has already moved on) is skipped.
+    Every update bumps statusVersion; the overall status and total are then written
+    conditionally on that version so a newer concurrent delta always wins.
+    
+    Raises ClientError (e.g. ConditionalCheckFailedException when the item does not exist)
+    so the caller can fall back to a full rebuild.
+    """
+    latest_changes = get_latest_changes_per_device(changes)
+    
+    by_target: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for device_id, change in latest_changes.items():
+        by_target.setdefault(get_status_attribute(change['newStatus']), {})[device_id] = change
+    
+    item = None
+    applied = 0
+    for target_attribute, devices in by_target.items():
+        device_ids = list(devices)
+        for i in range(0, len(device_ids), DELTA_CHUNK_SIZE):
+            chunk = {device_id: devices[device_id] for device_id in device_ids[i:i + DELTA_CHUNK_SIZE]}
+            try:
+                item = update_status_sets(system_id, target_attribute, chunk)
+                applied += len(chunk)
+                continue
+            except ClientError as e:
+                # A missing STATUS item is left to the caller's rebuild
+                if (e.response['Error']['Code'] != 'ConditionalCheckFailedException'
+                        or 'Item' not in table.get_item(Key={'PK': f'System#{system_id}', 'SK': 'STATUS'})):
+                    raise
+            
+            # Retry the devices one by one so only the stale ones are skipped
+            stale = chunk if len(chunk) == 1 else {}
+            if len(chunk) > 1:
+                for device_id, change in chunk.items():
+                    try:
+                        item = update_status_sets(system_id, target_attribute, {device_id: change})
+                        applied += 1
+                    except ClientError as e:
+                        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                            raise
+                        stale[device_id] = change
+            
+            for device_id, change in stale.items():
+                logger.info(f"Skipping stale status change for inverter {device_id} "
+                            f"({change['previousStatus']} → {change['newStatus']})")
+    
+    if item is None:
+        logger.info(f"No applicable status changes for system {system_id}")
+        return True
+    
+    green_inverters = list(item.get('GreenInverters', set()))
+    red_inverters = list(item.get('RedInverters', set()))
+    moon_inverters = list(item.get('MoonInverters', set()))
+    
+    overall_status = determine_system_status(green_inverters, red_inverters, moon_inverters)
+    total_inverters = len(green_inverters) + len(red_inverters) + len(moon_inverters)
+    
+    if overall_status != item.get('status') or total_inverters != int(item.get('TotalInverters', 0) or 0):
+        try:
+            table.update_item(
+                Key={'PK': f'System#{system_id}', 'SK': 'STATUS'},
+                UpdateExpression='SET #status = :status, TotalInverters = :total',
+                ConditionExpression='statusVersion = :version',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':status': overall_status,
+                    ':total': total_inverters,
+                    ':version': item['statusVersion']
+                }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            # A newer delta landed in between and will write the status itself
+            logger.info(f"System {system_id} status superseded by a newer update, skipping status write")
+            return True
+    
+    status_emoji = {"green": "✅", "red": "🔴", "moon": "🌙"}.get(overall_status, "❓")
+    logger.info(f"{status_emoji} Applied {applied}/{len(latest_changes)} delta(s) to system {system_id}, status {overall_status}")
+    logger.info(f"  Green: {len(green_inverters)}, Red: {len(red_inverters)}, Moon: {len(moon_inverters)}")
+    
+    return True
+
 def process_device_status_change(device_id: str, system_id: str, new_status: str, previous_status: str) -> bool:
     """Process a single device status change and update system status if needed"""
+    return process_system_status_changes(system_id, [{
+        'deviceId': device_id,
+        'pvSystemId': system_id,
+        'newStatus': new_status,
+        'previousStatus': previous_status
+    }])
+
+def process_system_status_changes(system_id: str, changes: List[Dict[str, Any]]) -> bool:
+    """Apply all device status changes for one system as a delta on its STATUS item"""
     try:
-        logger.info(f"Processing device status change: {device_id} ({system_id}) {previous_status} → {new_status}")
-        
-        # Get current status of all inverters for this system
-        inverter_statuses = get_inverter_statuses(system_id)
+        for change in changes:
+            logger.info(f"Processing device status change: {change['deviceId']} ({system_id}) {change['previousStatus']} → {change['newStatus']}")
         
-        # Update system status based on current inverter statuses
-        success = update_system_status(
-            system_id,
-            inverter_statuses['green'],
-            inverter_statuses['red'],
-            inverter_statuses['moon']
-        )
+        try:
+            success = apply_status_deltas(system_id, changes)
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            # ConditionalCheckFailed: no STATUS item yet. ValidationException: legacy
+            # record storing the inverters as lists. Both are repaired by a full rebuild.
+            if error_code not in ('ConditionalCheckFailedException', 'ValidationException'):
+                raise
+            logger.info(f"Delta update not applicable for system {system_id} ({error_code}), rebuilding")
+            success = rebuild_system_status(system_id)
         
         if success:
-            logger.info(f"✅ Successfully processed status change for device {device_id}")
+            logger.info(f"✅ Successfully processed {len(changes)} status change(s) for system {system_id}")
         else:
-            logger.error(f"❌ Failed to process status change for device {device_id}")
+            logger.error(f"❌ Failed to process {len(changes)} status change(s) for system {system_id}")
         
         return success
         
     except Exception as e:
-        logger.error(f"Error processing device status change for {device_id}: {str(e)}")
+        logger.error(f"Error processing status changes for system {system_id}: {str(e)}")
         return False
 
+def parse_status_change_record(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Extract the device status change message from an SNS record or an SQS record wrapping SNS"""
+    event_source = record.get('EventSource') or record.get('eventSource')
+    
+    if event_source == 'aws:sns':
+        message_body = record['Sns']['Message']
+    elif event_source == 'aws:sqs':
+        body = json.loads(record['body'])
+        # SQS subscriptions without raw message delivery wrap the SNS envelope
+        message_body = body.get('Message') if isinstance(body, dict) and 'Message' in body else record['body']
+    else:
+        return None
+    
+    message_data = json.loads(message_body) if isinstance(message_body, str) else message_body
+    
+    if not all([message_data.get('deviceId'), message_data.get('pvSystemId'),
+                message_data.get('newStatus'), message_data.get('previousStatus')]):
+        logger.warning(f"Incomplete message data: {message_data}")
+        return None
+    
+    return message_data
+
+def group_status_changes_by_system(records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Group parsed status change records by pvSystemId, keeping the SQS messageId when present"""
+    changes_by_system: Dict[str, List[Dict[str, Any]]] = {}
+    
+    for record in records:
+        try:
+            message_data = parse_status_change_record(record)
+            if not message_data:
+                continue
+            
+            change = dict(message_data)
+            if record.get('messageId'):
+                change['_messageId'] = record['messageId']
+            
+            changes_by_system.setdefault(message_data['pvSystemId'], []).append(change)
+            
+        except Exception as e:
+            logger.error(f"Error processing SNS record: {str(e)}")
+            continue
+    
+    return changes_by_system
+
 def lambda_handler(event, context):
-    """AWS Lambda handler function triggered by SNS"""
+    """AWS Lambda handler function triggered by SNS (directly or through an SQS subscription)
+    
+    Records are coalesced per pvSystemId so a batch in which many inverters of the
+    same site change state costs one recompute and one write for that system. Use an
+    SQS subscription with a larger BatchSize (e.g. 100) and a short batching window
+    to get multi-record batches; direct SNS triggers always deliver one record.
+    """
     try:
         logger.info("=== UPDATE STATUS LAMBDA TRIGGERED ===")
-        logger.info(f"Received event: {json.dumps(event, indent=2)}")
+        logger.info(f"Received {len(event.get('Records', []))} record(s)")
         
         processed_count = 0
         success_count = 0
+        batch_item_failures = []
         
-        # Process each SNS record
-        for record in event.get('Records', []):
-            if record.get('EventSource') == 'aws:sns':
-                try:
-                    # Parse SNS message
-                    message_body = record['Sns']['Message']
-                    message_data = json.loads(message_body)
-                    
-                    # Extract device information
-                    device_id = message_data.get('deviceId')
-                    system_id = message_data.get('pvSystemId')
-                    new_status = message_data.get('newStatus')
-                    previous_status = message_data.get('previousStatus')
-                    
-                    if not all([device_id, system_id, new_status, previous_status]):
-                        logger.warning(f"Incomplete message data: {message_data}")
-                        continue
-                    
-                    processed_count += 1
-                    
-                    # Process the device status change
-                    success = process_device_status_change(device_id, system_id, new_status, previous_status)
-                    
-                    if success:
-                        success_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error processing SNS record: {str(e)}")
-                    continue
+        changes_by_system = group_status_changes_by_system(event.get('Records', []))
+        logger.info(f"Coalesced into {len(changes_by_system)} system update(s)")
+        
+        for system_id, changes in changes_by_system.items():
+            processed_count += len(changes)
+            
+            if process_system_status_changes(system_id, changes):
+                success_count += len(changes)
+            else:
+                batch_item_failures.extend(
+                    {'itemIdentifier': change['_messageId']} for change in changes if change.get('_messageId')
+                )
         
         logger.info(f"=== UPDATE STATUS COMPLETED ===")
-        logger.info(f"📊 Processed: {processed_count} messages")
+        logger.info(f"📊 Processed: {processed_count} messages across {len(changes_by_system)} systems")
         logger.info(f"✅ Successful: {success_count} updates")
         logger.info(f"❌ Failed: {processed_count - success_count} updates")
         
         return {
             'statusCode': 200,
+            'batchItemFailures': batch_item_failures,
             'body': json.dumps({
                 'processed': processed_count,
+                'systems': len(changes_by_system),
                 'successful': success_count,
                 'failed': processed_count - success_count
             })
@@ -316,7 +536,6 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': str(e)})
         }
 
-
 def get_all_system_ids() -> List[str]:
     """Fetch all SystemIds by querying for PK begins with 'System#' and SK = 'PROFILE'"""
     system_ids = []
@@ -365,71 +584,38 @@ def get_all_system_ids() -> List[str]:
         return []
 
 
-def create_test_event(system_id: str) -> Dict[str, Any]:
-    """Create a test SNS event for triggering lambda handler"""
-    message_data = {
-        'deviceId': '1234',
-        'pvSystemId': system_id,
-        'newStatus': 'test',
-        'previousStatus': 'test'
-    }
-    
-    event = {
-        'Records': [
-            {
-                'EventSource': 'aws:sns',
-                'Sns': {
-                    'Message': json.dumps(message_data)
-                }
-            }
-        ]
-    }
-    
-    return event
-
-
-if __name__ == "__main__":
-    print("=== FETCHING ALL SYSTEM IDS AND TRIGGERING LAMBDA ===")
+def reconcile_handler(event, context):
+    """Periodic reconciliation job (e.g. an EventBridge rate rule) that fully rebuilds every
+    system STATUS item from the inverter STATUS items, correcting any drift from missed deltas"""
+    logger.info("=== SYSTEM STATUS RECONCILIATION TRIGGERED ===")
     
-    # Fetch all system IDs
     system_ids = get_all_system_ids()
-    
-    if not system_ids:
-        print("No systems found!")
-        exit(1)
-    
-    print(f"Found {len(system_ids)} systems. Processing each one...")
-    
-    # Process each system
-    processed_count = 0
     success_count = 0
     
     for system_id in system_ids:
         try:
-            print(f"\nProcessing system: {system_id}")
-            
-            # Create test event
-            event = create_test_event(system_id)
-            
-            # Trigger lambda handler
-            context = None  # Mock context for testing
-            result = lambda_handler(event, context)
-            
-            processed_count += 1
-            
-            if result.get('statusCode') == 200:
+            if rebuild_system_status(system_id):
                 success_count += 1
-                print(f"✅ Successfully processed system {system_id}")
-            else:
-                print(f"❌ Failed to process system {system_id}: {result}")
-                
         except Exception as e:
-            print(f"❌ Error processing system {system_id}: {str(e)}")
-            processed_count += 1
+            logger.error(f"Error reconciling system {system_id}: {str(e)}")
+    
+    logger.info(f"=== RECONCILIATION COMPLETED ===")
+    logger.info(f"📊 Systems: {len(system_ids)}")
+    logger.info(f"✅ Successful: {success_count}")
+    logger.info(f"❌ Failed: {len(system_ids) - success_count}")
     
-    print(f"\n=== PROCESSING COMPLETE ===")
-    print(f"📊 Total systems processed: {processed_count}")
-    print(f"✅ Successful: {success_count}")
-    print(f"❌ Failed: {processed_count - success_count}")
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'systems': len(system_ids),
+            'successful': success_count,
+            'failed': len(system_ids) - success_count
+        })
+    }
 
 
+if __name__ == "__main__":
+    print("=== RECONCILING ALL SYSTEM STATUSES ===")
+    
+    result = reconcile_handler({}, None)
+    print(json.dumps(json.loads(result['body']), indent=2))
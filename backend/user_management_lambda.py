@@ -1,21 +1,24 @@
 """
 User Management Lambda Function
 Handles: /api/user/*, /api/device/*
-Direct split from app.py with NO logic changes
+Originally split from app.py; registry and access map helpers live in system_registry.py
 """
 
 import os
 import json
+import base64
 import boto3
 from datetime import datetime
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from mangum import Mangum
 import logging
+import time
 from boto3.dynamodb.conditions import Key
+from system_registry import bump_access_map_version, get_all_system_ids
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +28,10 @@ logger = logging.getLogger(__name__)
 AWS_REGION = os.environ.get('AWS_REGION_', 'us-east-1')
 DYNAMODB_TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME', 'Moose-DDB')
 
+# Process-level cache of device/system display names: PK -> (name, fetchedAt)
+NAME_CACHE_TTL_SECONDS = int(os.environ.get('NAME_CACHE_TTL_SECONDS', '3600'))
+name_cache: Dict[str, tuple] = {}
+
 # Initialize DynamoDB client
 try:
     dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
@@ -49,6 +56,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients read the incidents pagination cursor
+    expose_headers=["X-Next-Cursor"],
 )
 
 #---------------------------------------
@@ -93,6 +102,8 @@ def register_device_in_db(device_data: DeviceRegistration) -> DeviceResponse:
             }
         )
         
+        bump_access_map_version(table)
+        
         return DeviceResponse(
             success=True,
             message="Device registered successfully",
@@ -122,6 +133,8 @@ def delete_device_from_db(user_id: str, device_id: str) -> DeviceResponse:
             }
         )
         
+        bump_access_map_version(table)
+        
         return DeviceResponse(
             success=True,
             message="Device deleted successfully",
@@ -155,35 +168,7 @@ def get_user_systems(user_id: str) -> List[str]:
         
         if is_admin:
             # Admin users can access all systems
-            # Query all systems in the database
-            systems = []
-            response = table.scan(
-                FilterExpression='begins_with(PK, :pk)',
-                ExpressionAttributeValues={
-                    ':pk': 'System#'
-                }
-            )
-            
-            
-            for item in response.get('Items', []):
-                system_id = item['PK'].replace('System#', '')
-                if system_id not in systems:
-                    systems.append(system_id)
-            while 'LastEvaluatedKey' in response:
-                response = table.scan(
-                    ExclusiveStartKey=response['LastEvaluatedKey'],
-                    FilterExpression='begins_with(PK, :pk)',
-                    ExpressionAttributeValues={
-                        ':pk': 'System#'
-                    }
-                )
-                for item in response.get('Items', []):
-                    system_id = item['PK'].replace('System#', '')
-                    if system_id not in systems:
-                        systems.append(system_id)
-       
-            
-            return systems
+            return get_all_system_ids(table)
         else:
             # Regular users can only access systems they're linked to
             response = table.query(
@@ -222,16 +207,6 @@ def get_user_profile(user_id: str) -> Dict[str, Any]:
         if 'Item' in response:
             profile = response['Item']
             # Convert Decimal objects to float for JSON serialization
-            def convert_decimals(obj):
-                if isinstance(obj, list):
-                    return [convert_decimals(i) for i in obj]
-                elif isinstance(obj, dict):
-                    return {k: convert_decimals(v) for k, v in obj.items()}
-                elif isinstance(obj, Decimal):
-                    return float(obj)
-                else:
-                    return obj
-            
             return convert_decimals(profile)
         else:
             return {"error": "User profile not found"}
@@ -239,79 +214,151 @@ def get_user_profile(user_id: str) -> Dict[str, Any]:
         logger.error(f"Error getting user profile: {str(e)}")
         return {"error": f"Failed to get user profile: {str(e)}"}
 
-def get_user_incidents(user_id: str) -> List[Dict[str, Any]]:
-    """Get pending incident records for a specific user using GSI3PK"""
+def convert_decimals(obj):
+    """Convert Decimal objects to regular numbers for JSON serialization"""
+    if isinstance(obj, list):
+        return [convert_decimals(i) for i in obj]
+    elif isinstance(obj, dict):
+        return {k: convert_decimals(v) for k, v in obj.items()}
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    else:
+        return obj
+
+def encode_cursor(last_evaluated_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Encode a DynamoDB LastEvaluatedKey as an opaque pagination cursor"""
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(convert_decimals(last_evaluated_key)).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: Optional[str], partition_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Decode a pagination cursor back into an ExclusiveStartKey
+    
+    Raises ValueError for a cursor that is malformed or belongs to another partition.
+    """
+    if not cursor:
+        return None
+    try:
+        start_key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    
+    if not isinstance(start_key, dict) or not start_key or not all(
+        isinstance(k, str) and isinstance(v, (str, int, float)) for k, v in start_key.items()
+    ):
+        raise ValueError("Invalid cursor")
+    if partition_key and start_key.get('GSI3PK') != partition_key:
+        raise ValueError("Invalid cursor")
+    return start_key
+
+def get_item_names(keys: List[Dict[str, str]], attribute: str) -> Dict[str, str]:
+    """Resolve display names for PROFILE items via the process-level cache and one batch_get_item"""
+    now = time.time()
+    names = {}
+    missing = []
+    
+    for key in {key['PK']: key for key in keys}.values():
+        cached = name_cache.get(key['PK'])
+        if cached and now - cached[1] < NAME_CACHE_TTL_SECONDS:
+            names[key['PK']] = cached[0]
+        else:
+            missing.append(key)
+    
+    for i in range(0, len(missing), 100):
+        request_items = {
+            table.name: {
+                'Keys': missing[i:i + 100],
+                'ProjectionExpression': 'PK, #name',
+                'ExpressionAttributeNames': {'#name': attribute}
+            }
+        }
+        attempt = 0
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for item in response.get('Responses', {}).get(table.name, []):
+                if item.get(attribute):
+                    names[item['PK']] = item[attribute]
+                    name_cache[item['PK']] = (item[attribute], now)
+            
+            # Retry throttled keys with exponential backoff
+            request_items = response.get('UnprocessedKeys') or {}
+            if request_items:
+                attempt += 1
+                if attempt > 5:
+                    logger.warning(f"Giving up on {len(request_items[table.name]['Keys'])} unprocessed name lookups")
+                    break
+                time.sleep(0.05 * (2 ** attempt))
+    
+    return names
+
+def get_user_incidents(user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Get pending incident records for a specific user using GSI3PK
+    
+    Returns {'incidents': [...], 'nextCursor': ...}; without a limit every page is read.
+    """
+    # Outside the try so a bad cursor reaches the endpoint as a ValueError (400)
+    start_key = decode_cursor(cursor, f'User#{user_id}')
+    
     try:
         if not table:
             logger.error("Database connection not available")
-            return []
+            return {'incidents': [], 'nextCursor': None}
         
-        response = table.query(
-            IndexName='incident-user-index',  # Make sure this matches your GSI name
-            KeyConditionExpression=Key('GSI3PK').eq(f'User#{user_id}'),
-            FilterExpression='begins_with(PK, :incident_prefix) AND #status = :status',
-            ExpressionAttributeNames={
+        query_kwargs = {
+            'IndexName': 'incident-user-index',  # Make sure this matches your GSI name
+            'KeyConditionExpression': Key('GSI3PK').eq(f'User#{user_id}'),
+            'FilterExpression': 'begins_with(PK, :incident_prefix) AND #status = :status',
+            'ExpressionAttributeNames': {
                 '#status': 'status'
             },
-            ExpressionAttributeValues={
+            'ExpressionAttributeValues': {
                 ':incident_prefix': 'Incident#',
                 ':status': 'pending'
             }
-        )
+        }
         
         incidents = []
-        for item in response.get('Items', []):
-            # Convert Decimal objects to regular numbers for JSON serialization
-            def convert_decimals(obj):
-                if isinstance(obj, list):
-                    return [convert_decimals(i) for i in obj]
-                elif isinstance(obj, dict):
-                    return {k: convert_decimals(v) for k, v in obj.items()}
-                elif isinstance(obj, Decimal):
-                    return float(obj)
-                else:
-                    return obj
+        while True:
+            if start_key:
+                query_kwargs['ExclusiveStartKey'] = start_key
+            if limit:
+                # Limit applies before the filter, so this never overshoots the page size
+                query_kwargs['Limit'] = limit - len(incidents)
+            
+            response = table.query(**query_kwargs)
+            incidents.extend(convert_decimals(item) for item in response.get('Items', []))
+            start_key = response.get('LastEvaluatedKey')
             
-            incidents.append(convert_decimals(item))
+            if not start_key or (limit and len(incidents) >= limit):
+                break
+        
+        # Enrich incidents with device and system names in one batch; names that
+        # cannot be resolved fall back to the default below
+        try:
+            device_names = get_item_names(
+                [{'PK': f'Inverter#{incident["deviceId"]}', 'SK': 'PROFILE'} for incident in incidents], 'deviceName'
+            )
+        except Exception as e:
+            logger.warning(f"Could not resolve device names: {str(e)}")
+            device_names = {}
+        try:
+            system_names = get_item_names(
+                [{'PK': f'System#{incident["systemId"]}', 'SK': 'PROFILE'} for incident in incidents], 'name'
+            )
+        except Exception as e:
+            logger.warning(f"Could not resolve system names: {str(e)}")
+            system_names = {}
         
-        # Enrich incidents with device and system names
         for incident in incidents:
-            # Get device name
-            try:
-                device_response = table.get_item(
-                    Key={
-                        'PK': f'Inverter#{incident["deviceId"]}',
-                        'SK': 'PROFILE'
-                    }
-                )
-                device_name = device_response.get('Item', {}).get('deviceName', f'Device {incident["deviceId"]}')
-            except Exception as e:
-                logger.warning(f"Failed to get device name for {incident['deviceId']}: {str(e)}")
-                device_name = f'Device {incident["deviceId"]}'
-            
-            # Get system name
-            try:
-                system_response = table.get_item(
-                    Key={
-                        'PK': f'System#{incident["systemId"]}',
-                        'SK': 'PROFILE'
-                    }
-                )
-                system_name = system_response.get('Item', {}).get('name', f'System {incident["systemId"]}')
-            except Exception as e:
-                logger.warning(f"Failed to get system name for {incident['systemId']}: {str(e)}")
-                system_name = f'System {incident["systemId"]}'
-            
-            # Add names to incident
-            incident['device_name'] = device_name
-            incident['system_name'] = system_name
+            incident['device_name'] = device_names.get(f'Inverter#{incident["deviceId"]}', f'Device {incident["deviceId"]}')
+            incident['system_name'] = system_names.get(f'System#{incident["systemId"]}', f'System {incident["systemId"]}')
         
         logger.info(f"Found {len(incidents)} incidents for user {user_id}")
-        return incidents
+        return {'incidents': incidents, 'nextCursor': encode_cursor(start_key)}
         
     except Exception as e:
         logger.error(f"Error getting user incidents: {str(e)}")
-        return []
+        return {'incidents': [], 'nextCursor': None}
 
 def update_incident_status(user_id: str, incident_id: str, action: str) -> Dict[str, Any]:
     """Update incident status based on user action"""
@@ -407,12 +454,25 @@ async def delete_device_endpoint(user_id: str, device_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to delete device: {str(e)}")
 
 @app.get("/api/user/{user_id}/incidents")
-async def get_user_incidents_endpoint(user_id: str):
-    """Get all incident records for a specific user"""
+async def get_user_incidents_endpoint(
+    user_id: str,
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None)
+):
+    """Get incident records for a specific user
+    
+    Returns the incident list as before; when more pages exist the cursor for the
+    next page is returned in the X-Next-Cursor header.
+    """
     try:
-        logger.info(f"GET /api/user/{user_id}/incidents")
-        incidents = get_user_incidents(user_id)
-        return incidents
+        logger.info(f"GET /api/user/{user_id}/incidents (limit={limit})")
+        result = get_user_incidents(user_id, limit, cursor)
+        if result['nextCursor']:
+            response.headers['X-Next-Cursor'] = result['nextCursor']
+        return result['incidents']
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in get_user_incidents_endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get user incidents: {str(e)}")